@@ -0,0 +1,48 @@
+"""Deep nesting benchmark.
+
+Checks strings of the form '((( ... )))' of growing depth and prints the time per character for every engine. With
+O(1) stack operations the time per character stays flat as the depth grows; a stack copied on every pop would make
+it grow linearly with the depth.
+
+Usage: python benchmarks/bench_nesting.py [max_depth]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from strbalance import Balance  # noqa: E402
+
+
+def nested(depth):
+    return '(' * depth + '[{}]' + ')' * depth
+
+
+def measure(balance, string, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        balance.is_unbalanced(string)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(max_depth=100000):
+    print('{:<8}{:>10}{:>16}'.format('engine', 'depth', 'ns per char'))
+    for engine in Balance.ENGINES:
+        try:
+            balance = Balance(engine=engine)
+        except ImportError:  # An optional dependency of the engine is not installed
+            continue
+        depth = 1000
+        while depth <= max_depth:
+            string = nested(depth)
+            print('{:<8}{:>10}{:>16.1f}'.format(engine, depth, measure(balance, string) / len(string) * 1e9))
+            depth *= 10
+
+
+if __name__ == '__main__':
+    main(*[int(argument) for argument in sys.argv[1:]])
@@ -0,0 +1,117 @@
+"""Startup benchmark: cold import plus the first check in a new process.
+
+Every case runs REPEAT fresh interpreters, each of which imports strbalance, gets a Balance object (constructed from
+the parameters or loaded from the bytes of Balance.dumps(), as a short-lived worker would) and checks one short
+string. Every interpreter reports the time of each step, measured inside it:
+    import      import strbalance
+    balance     Balance(**parameters) or Balance.loads(data)
+    check       The first is_unbalanced() call, which compiles whatever the Balance object compiles on first use
+    total       The sum of the above
+The median of every step is printed in milliseconds. The results are compared with the baseline stored in
+BASELINE_PATH, which was recorded on one machine; the exit code is 1 if the total of any case grows by more than the
+tolerance.
+
+Usage: python benchmarks/bench_startup.py [--repeat REPEAT] [--tolerance TOLERANCE] [--save] [cases ...]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+
+from strbalance import Balance  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'startup_baseline.json')
+STEPS = ['import', 'balance', 'check', 'total']
+TEXT = 'A short text (with [brackets], «quotes» and <b>tags</b>) to check.'
+# Parameters must be JSON-serializable
+CASES = [('default', {}), ('tags', {'tags': True, 'straight': True, 'cjk': True}), ('regex', {'engine': 'regex'}),
+         ('skip', {'skip': Balance.SKIP_CODE + [['<!--', '-->']]})]
+
+# Runs in every new interpreter with the parameters (or the dumped Balance) and the text as arguments
+CHILD = '''
+import sys, time
+start = time.perf_counter()
+import strbalance
+imported = time.perf_counter()
+import json
+json_time = time.perf_counter() - imported
+if sys.argv[1] == 'loads':
+    balance = strbalance.Balance.loads(sys.argv[2].encode('utf-8'))
+else:
+    balance = strbalance.Balance(**json.loads(sys.argv[2]))
+created = time.perf_counter()
+balance.is_unbalanced(sys.argv[3])
+checked = time.perf_counter()
+print(json.dumps([imported - start, created - imported - json_time, checked - created]))
+'''
+
+
+def measure(mode, argument, repeat):
+    """Return the median time of every step in milliseconds over repeat new interpreters."""
+    times = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', CHILD, mode, argument, TEXT], cwd=ROOT, check=True,
+                                stdout=subprocess.PIPE, universal_newlines=True).stdout
+        steps = json.loads(output)
+        times.append(steps + [sum(steps)])
+    return {step: round(statistics.median(column) * 1000, 3) for step, column in zip(STEPS, zip(*times))}
+
+
+def run(names, repeat):
+    """Return {'case/constructed' or 'case/loaded': {step: milliseconds}} for the cases with the names."""
+    results = {}
+    for name, parameters in CASES:
+        if names and name not in names:
+            continue
+        results[name + '/constructed'] = measure('parameters', json.dumps(parameters), repeat)
+        results[name + '/loaded'] = measure('loads', Balance(**parameters).dumps().decode('utf-8'), repeat)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Print the results with the ratio of the totals to the baseline and return the number of regressions."""
+    regressions = 0
+    print(('{:<22}' + '{:>10}' * (len(STEPS) + 1)).format('case', *STEPS, 'ratio'))
+    for key, result in results.items():
+        line = ('{:<22}' + '{:>10.2f}' * len(STEPS)).format(key, *(result[step] for step in STEPS))
+        if key in baseline:
+            ratio = result['total'] / baseline[key]['total']
+            regressed = ratio > 1 + tolerance
+            regressions += regressed
+            line += '{:>10.2f}{}'.format(ratio, '  REGRESSION' if regressed else '')
+        else:
+            line += '{:>10}'.format('-')
+        print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark cold import plus the first check in new processes.')
+    parser.add_argument('cases', nargs='*', help='names of the cases to run (all by default)')
+    parser.add_argument('--repeat', type=int, default=15, help='number of new interpreters for every case')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='allowed relative regression of the total')
+    parser.add_argument('--save', action='store_true', help='save the results as the new baseline')
+    arguments = parser.parse_args()
+
+    results = run(arguments.cases, arguments.repeat)
+    baseline = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as baseline_file:
+            baseline = json.load(baseline_file)
+    regressions = compare(results, baseline, arguments.tolerance)
+
+    if arguments.save:
+        with open(BASELINE_PATH, 'w') as baseline_file:
+            json.dump(results, baseline_file, indent=2, sort_keys=True)
+            baseline_file.write('\n')
+    return 1 if regressions and not arguments.save else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,217 @@
+"""Throughput and memory benchmark of every engine on generated inputs of every shape.
+
+Every case is a balancing configuration with a balanced input of the given size generated from a fixed seed, so the
+whole input is scanned and the inputs are the same on every run:
+    prose       Long plain text with a little punctuation of every default kind.
+    dense       Brackets and quotation marks with little text between them.
+    deep        One nesting of parentheses as deep as half the size.
+    custom      Many custom multi-character pairs and symmetrical sequences only.
+    cjk         Japanese text with CJK brackets and quotation signs.
+    tags        HTML with attributes, comments and void elements.
+    straight    Text with straight quotation marks.
+Every engine which accepts the configuration (and whose dependencies are installed) checks the input REPEAT times;
+the best time gives the throughput in characters per second. One more check under tracemalloc gives the peak of the
+memory allocated during it.
+
+The results are compared with the baseline stored in BASELINE_PATH, which was recorded on one machine: compare only
+results from the same machine, and save a new baseline before changing the hot loop. The exit code is 1 if the
+throughput of any case drops or its memory peak grows by more than the tolerance.
+
+Usage: python benchmarks/bench_suite.py [--size SIZE] [--repeat REPEAT] [--tolerance TOLERANCE] [--save] [cases ...]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from strbalance import Balance  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+SEED = 2024
+WORDS = ['lorem', 'ipsum', 'dolor', 'sit', 'amet', 'consectetur', 'adipiscing', 'elit', 'sed', 'do', 'eiusmod',
+         'tempor', 'incididunt', 'ut', 'labore', 'et', 'dolore', 'magna', 'aliqua']
+CJK_WORDS = ['日本語', 'テキスト', 'です', 'これは', '文章', 'の', '例', 'として', '使われる']
+CUSTOM_PAIRS = [['begin', 'end'], ['if', 'fi'], ['<<', '>>'], ['/*', '*/'], ['{{', '}}'], ['[[', ']]'],
+                ['\\(', '\\)'], ['«—', '—»'], ['(:', ':)'], ['do', 'done']]
+CUSTOM_SYMMETRICAL = ['**', '__', '$$', '``']
+
+
+def _text(generator, size, words, separator=' '):
+    # Words joined with the separator up to the size
+    pieces = []
+    length = 0
+    while length < size:
+        word = generator.choice(words)
+        pieces.append(word)
+        length += len(word) + len(separator)
+    return separator.join(pieces)[:size]
+
+
+def _nested(generator, size, pairs, words, depth, density):
+    # Balanced nesting of pairs with about density of the text being punctuation, at most depth deep
+    pieces = []
+    stack = []
+    length = 0
+    while length < size:
+        if stack and (len(stack) >= depth or generator.random() < 0.5 * density):
+            piece = stack.pop()
+        elif generator.random() < density:
+            opening, closing = generator.choice(pairs)
+            stack.append(closing)
+            piece = opening
+        else:
+            piece = generator.choice(words) + ' '
+        pieces.append(piece)
+        length += len(piece)
+    pieces.extend(reversed(stack))
+    return ''.join(pieces)
+
+
+def prose(generator, size):
+    pairs = Balance.BRACKETS + Balance.FRENCH_QUOTES
+    return _nested(generator, size, pairs, WORDS, 3, 0.02)
+
+
+def dense(generator, size):
+    pairs = Balance.BRACKETS + Balance.FRENCH_QUOTES
+    return _nested(generator, size, pairs, ['a', 'b', ''], 8, 0.8)
+
+
+def deep(generator, size):
+    return '(' * (size // 2) + ')' * (size // 2)
+
+
+def custom(generator, size):
+    pairs = CUSTOM_PAIRS + [[line, line] for line in CUSTOM_SYMMETRICAL]
+    lines = [line for pair in pairs for line in pair]
+    words = [word for word in WORDS if not any(line in word for line in lines)]
+    return _nested(generator, size, pairs, words, 4, 0.1)
+
+
+def cjk(generator, size):
+    return _nested(generator, size, Balance.CJK_PUNCTUATION, CJK_WORDS, 4, 0.1)
+
+
+def tags(generator, size):
+    elements = ['div', 'p', 'span', 'a', 'em', 'li', 'td']
+    pieces = []
+    stack = []
+    length = 0
+    while length < size:
+        choice = generator.random()
+        if stack and (len(stack) >= 6 or choice < 0.2):
+            piece = '</' + stack.pop() + '>'
+        elif choice < 0.4:
+            element = generator.choice(elements)
+            stack.append(element)
+            piece = '<{} class="c{}" title="a > b">'.format(element, generator.randint(0, 99))
+        elif choice < 0.45:
+            piece = generator.choice(['<br>', '<img src="x.png"/>', '<!-- comment (not closed -->'])
+        else:
+            piece = _text(generator, 40, WORDS) + ' '
+        pieces.append(piece)
+        length += len(piece)
+    pieces.extend('</' + element + '>' for element in reversed(stack))
+    return ''.join(pieces)
+
+
+def straight(generator, size):
+    pairs = [['"', '"'], ["'", "'"]] + Balance.BRACKETS
+    return _nested(generator, size, pairs, WORDS, 2, 0.05)
+
+
+CASES = [('prose', prose, {}), ('dense', dense, {}), ('deep', deep, {}),
+         ('custom', custom, {'pairs': CUSTOM_PAIRS, 'symmetrical': CUSTOM_SYMMETRICAL, 'custom': True}),
+         ('cjk', cjk, {'cjk': True}), ('tags', tags, {'tags': True}), ('straight', straight, {'straight': True})]
+
+
+def measure(balance, string, repeat):
+    """Return the best time of repeat checks of the string and the memory peak of one more check in bytes."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = balance.is_unbalanced(string)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    if result is not None:
+        raise AssertionError('generated input is unbalanced: ' + result.long_summary)
+
+    tracemalloc.start()
+    balance.is_unbalanced(string)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak
+
+
+def run(names, size, repeat):
+    """Return {'case/engine': {'chars_per_second': ..., 'peak_bytes': ...}} for the cases with the names."""
+    results = {}
+    for name, generate, configuration in CASES:
+        if names and name not in names:
+            continue
+        string = generate(random.Random(SEED), size)
+        for engine in Balance.ENGINES:
+            try:
+                balance = Balance(engine=engine, **configuration)
+            except (ImportError, ValueError):  # The engine doesn't support the configuration or isn't installed
+                continue
+            elapsed, peak = measure(balance, string, repeat)
+            results[name + '/' + engine] = {'chars_per_second': round(len(string) / elapsed), 'peak_bytes': peak}
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Print the results with the ratio to the baseline and return the number of regressions."""
+    regressions = 0
+    print('{:<18}{:>14}{:>10}{:>14}{:>10}'.format('case', 'Mchar/s', 'ratio', 'peak KiB', 'ratio'))
+    for key, result in results.items():
+        speed, peak = result['chars_per_second'], result['peak_bytes']
+        line = '{:<18}{:>14.2f}'.format(key, speed / 1e6)
+        if key in baseline:
+            speed_ratio = speed / baseline[key]['chars_per_second']
+            peak_ratio = peak / max(1, baseline[key]['peak_bytes'])
+            regressed = speed_ratio < 1 - tolerance or peak_ratio > 1 + tolerance
+            regressions += regressed
+            line += '{:>10.2f}{:>14.1f}{:>10.2f}{}'.format(speed_ratio, peak / 1024, peak_ratio,
+                                                           '  REGRESSION' if regressed else '')
+        else:
+            line += '{:>10}{:>14.1f}{:>10}'.format('-', peak / 1024, '-')
+        print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark every engine on generated inputs of every shape.')
+    parser.add_argument('cases', nargs='*', help='names of the cases to run (all by default)')
+    parser.add_argument('--size', type=int, default=1 << 20, help='length of every input in characters')
+    parser.add_argument('--repeat', type=int, default=3, help='number of timed checks of every input')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative regression')
+    parser.add_argument('--save', action='store_true', help='save the results as the new baseline')
+    arguments = parser.parse_args()
+
+    results = run(arguments.cases, arguments.size, arguments.repeat)
+    baseline = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as baseline_file:
+            stored = json.load(baseline_file)
+        if stored['size'] == arguments.size:
+            baseline = stored['results']
+        else:
+            print('The baseline was recorded for size {}, not compared'.format(stored['size']))
+    regressions = compare(results, baseline, arguments.tolerance)
+
+    if arguments.save:
+        with open(BASELINE_PATH, 'w') as baseline_file:
+            json.dump({'size': arguments.size, 'results': results}, baseline_file, indent=2, sort_keys=True)
+            baseline_file.write('\n')
+    return 1 if regressions and not arguments.save else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -14,6 +14,12 @@ setup(
     url="https://github.com/tamila-krashtan/strbalance",
     packages=find_packages(),
     python_requires='>=3',
+    entry_points={
+        'console_scripts': ['strbalance = strbalance.cli:main'],
+    },
+    extras_require={
+        'numpy': ['numpy'],
+    },
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",
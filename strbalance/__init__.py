@@ -1,2 +1,7 @@
 from strbalance.balance import Balance
-from strbalance.strbalance import is_unbalanced
+from strbalance.multi import MultiBalance
+from strbalance.pairs import PairTable
+from strbalance.scanner import LimitExceeded
+from strbalance.stats import ScanStats
+from strbalance.strbalance import (cache_clear, cache_info, check_file, is_balanced, is_unbalanced,
+                                   is_unbalanced_bytes, set_cache_size)
@@ -0,0 +1,5 @@
+import sys
+
+from strbalance.cli import main
+
+sys.exit(main())
@@ -1,11 +1,39 @@
+import codecs
+import mmap
+import os
+import sys
+
+from strbalance.files import BytesUnbalanced, FileUnbalanced, MappedText
+from strbalance.incremental import IncrementalScanner
+from strbalance.pairs import find_pairs
+from strbalance.scanner import LimitExceeded, RecoveringScanner, Scanner
+from strbalance.stats import InstrumentedScanner
 from strbalance.unbalanced import Unbalanced
 
 
+class _LazyClassAttribute:
+    # The class attribute is computed by the function on first access and then replaces the descriptor in the class:
+    # importing re and compiling the patterns take longer than importing the rest of the package
+
+    def __init__(self, function):
+        self._function = function
+
+    def __set_name__(self, owner, name):
+        self._owner = owner
+        self._name = name
+
+    def __get__(self, instance, owner):
+        value = self._function()
+        setattr(self._owner, self._name, value)
+        return value
+
+
 class Balance:
     u"""Balance checker for strings with given balancing parameters.
 
-    Class exports method is_balanced() which takes string as a parameter. The method returns None if the string is
-    balanced or an Unbalanced object otherwise (see help(Unbalanced) for more details).
+    Class exports method is_unbalanced() which takes string as a parameter. The method returns None if the string is
+    balanced or an Unbalanced object otherwise (see help(Unbalanced) for more details). Method is_balanced() only
+    returns True or False, at a lower cost.
 
     The pairs of characters matched by default (listed in BRACKETS and FRENCH_QUOTES):
     (…)  parentheses
@@ -25,7 +53,9 @@ class Balance:
 
         All other parameters are boolean and default to False:
             tags            Match HTML (XML) paired tags (case sensitive), except those in UNPAIRED_TAGS, which are
-                            normally not closed in HTML.
+                            normally not closed in HTML. Every tag is read as a whole, so punctuation in attributes
+                            is ignored; so are comments, CDATA sections, declarations such as <!DOCTYPE html> and
+                            processing instructions (SPECIAL_TAGS).
             ignore_case     Ignore case in tags.
             cjk             Include CJK brackets and quotation signs listed in CJK_PUNCTUATION: ｢…｣, 「…」, 〈…〉, 《…》,
                             『…』, （…）, ［…］, ＜…＞, ｛…｝, ｟…｠, 【…】, 〔…〕, 〖…〗, 〘…〙, 〚…〛.
@@ -35,6 +65,46 @@ class Balance:
                             instead of “…”, ‘…’, «…», ‹…› (FRENCH_QUOTES).
             math            Match parentheses with brackets in order to include mathematical [a,c) notation (additional
                             pairs to match are listed in ADDITIONAL_MATH_PAIRS).
+
+        skip defaults to None:
+            skip            A list of rules for regions of the string which are not checked, such as code and URLs:
+                            [['start', 'end'], ['start', pattern] ...]. A region begins with the start string, before
+                            any punctuation at the same position, and ends after the first occurrence of the end string
+                            or the first match of the compiled pattern after the start; a region which doesn't end goes
+                            on to the end of the text. The string is not copied: regions are jumped over in one step and
+                            positions in the results are those of the original string. Ready rules are listed in
+                            SKIP_ESCAPES (a backslash and the character after it), SKIP_CODE (Markdown code blocks and
+                            spans) and SKIP_URLS (URLs with balanced parentheses in them). In a text checked in parts
+                            (feed(), check_file(), incremental()), a pattern is expected to depend on no more than
+                            SKIP_PATTERN_LOOKAHEAD characters after its match.
+
+        engine defaults to 'trie':
+            engine          The way the string is scanned (one of ENGINES): 'trie' visits every character and looks up
+                            punctuation in a prefix tree, 'regex' jumps from one punctuation sequence to the next with
+                            a single compiled pattern, which is faster for texts with little punctuation. 'numpy'
+                            requires NumPy and single-character pairs without symmetrical and tags: it checks whole
+                            strings in bulk with array operations (see help(strbalance.vectorized)) and scans only
+                            unbalanced ones to find the unbalanced element, in the way of 'trie'. 'generated' checks
+                            whole strings with a function whose source is generated for the parameters from the pattern
+                            of 'regex' (see help(strbalance.generated)); other checks scan in the way of 'trie'.
+
+        Limits default to None (no limit); a check which exceeds any of them raises LimitExceeded, which records the
+        position the scan got to. They are checked only while scanning, so the 'numpy' engine doesn't check strings in
+        bulk when a limit is set:
+            max_depth       Maximum depth of the punctuation stack.
+            max_input_length
+                            Maximum length of the text to check (in bytes for is_unbalanced_bytes()).
+            timeout         Maximum time of a scan in seconds: of a check, of a chunk passed to feed(), of an edit
+                            passed to apply_edit(), of each result of find_all() or of each chunk of a parallel check.
+
+    Balance objects don't change after construction, apart from the patterns they compile on first use: every check
+    keeps its state in its own Scanner object (see help(Scanner)), so one Balance can serve any number of threads
+    without locks. The only exception is feed() and finish(), which keep the text between the calls; use stream() to
+    get an independent Scanner instead.
+
+    dumps() returns the compiled parameters as bytes, and Balance.loads() turns them back into a Balance object without
+    validating and sorting them again, e.g. in short-lived worker processes. Whatever a check needs beyond that (the
+    prefix tree, the patterns) is compiled on its first use.
     """
 
     BRACKETS = [['(', ')'], ['[', ']'], ['{', '}']]
@@ -45,19 +115,71 @@ class Balance:
                        ['〚', '〛']]
     STRAIGHT = ['"', "'"]
     ADDITIONAL_MATH_PAIRS = [['(', ']'], ['[', ')']]
+    SKIP_CODE = [['```', '```'], ['~~~', '~~~'], ['``', '``'], ['`', '`']]
     UNPAIRED_TAGS = ['area', 'base', 'br', 'col', 'command', 'embed', 'hr', 'img', 'input', 'keygen', 'link',
                      'menuitem', 'meta', 'param', 'source', 'track', 'wbr']
 
-    LATIN_LETTERS = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
     TAG_BEGIN = '<'
     TAG_END = '>'
     TAG_CLOSE = '/'
-
-    PUNCTUATION_TYPES = {'non-tag': 0, 'incomplete-tag': 1, 'opened-tag': 2}
+    LATIN_LETTERS = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    TAG_NAME = '[a-zA-Z][a-zA-Z0-9_.:-]*'  # Begins with one of LATIN_LETTERS
+    TAG_WHITESPACE = ' \t\n\r\f'  # HTML whitespace, allowed at the end of closing tags; the same in strings and bytes
+    SPECIAL_TAGS = [['<!--', '-->'], ['<![CDATA[', ']]>'], ['<?', '?>'], ['<!', '>']]  # Skipped, the first match wins
+
+    PUNCTUATION_TYPES = {'non-tag': 0, 'incomplete-tag': 1, 'opened-tag': 2}  # Incomplete tags are no longer stacked
+    TAG_TOKENS = {'opening': 0, 'closing': 1, 'skipped': 2, 'incomplete': 3}
+    PUNCTUATION_KINDS = {'tag': 0, 'opening': 1, 'symmetrical': 2, 'closing': 3, 'skip': 4}  # higher wins over longer
+    ENGINES = ['trie', 'regex', 'numpy', 'generated']
+    FILE_CHUNK_SIZE = 1 << 20
+    PARALLEL_CHUNK_SIZE = 1 << 20
+    VECTORIZED_MIN_LENGTH = 256  # Shorter strings are scanned by the 'numpy' engine at once
+    SKIP_PATTERN_LOOKAHEAD = 256  # Text needed after the match of the end pattern of a region in an unfinished text
+    DUMP_FORMAT = 1  # Version of the format of dumps()
+
+    @_LazyClassAttribute
+    def SKIP_ESCAPES():
+        import re
+        return [['\\', re.compile('.', re.DOTALL)]]
+
+    @_LazyClassAttribute
+    def URL_PATTERN():  # The rest of the URL after its scheme
+        import re
+        return re.compile('(?:[^\\s()<>"]|\\([^\\s()<>"]*\\))*')
+
+    @_LazyClassAttribute
+    def SKIP_URLS():
+        return [['http://', Balance.URL_PATTERN], ['https://', Balance.URL_PATTERN]]
+
+    @_LazyClassAttribute
+    def OPENING_TAG_PATTERN():  # Without TAG_END
+        import re
+        return re.compile('<(' + Balance.TAG_NAME + ')(?:[^<>"\']|"[^"]*"|\'[^\']*\')*')
+
+    @_LazyClassAttribute
+    def CLOSING_TAG_PATTERN():
+        import re
+        return re.compile('</(' + Balance.TAG_NAME + ')[' + Balance.TAG_WHITESPACE + ']*')
+
+    @_LazyClassAttribute
+    def TAG_STOP_PATTERN():  # Characters which end or change the reading of an opening tag
+        import re
+        return re.compile('[<>"\']')
+
+    # Attributes derived from the compiled parameters by _compile() and on first use, which pickles leave out
+    _DERIVED_ATTRIBUTES = frozenset(['_unpaired_tags', '_max_length', '_lookahead', '_limited', '_vectorized',
+                                     '_stream', '_encoded', '_trie', '_line_ids', '_id_closings', '_pattern',
+                                     '_pattern_kinds', '_tag_pattern', '_generated_scan'])
 
     def __init__(self, pairs=None, symmetrical=None, tags=False, ignore_case=False, cjk=False, straight=False,
-                 custom=False, german=False, math=False):
+                 custom=False, german=False, math=False, engine='trie', max_depth=None, max_input_length=None,
+                 timeout=None, skip=None):
         """Initialize Balance object with given balancing parameters (see help(Balance) for more details)."""
+        if engine not in self.ENGINES:
+            raise ValueError('engine must be one of: {}'.format(', '.join(self.ENGINES)))
+        for name, limit in (('max_depth', max_depth), ('max_input_length', max_input_length), ('timeout', timeout)):
+            if limit is not None and (isinstance(limit, bool) or not isinstance(limit, (int, float)) or limit < 0):
+                raise ValueError('{} must be None or a non-negative number'.format(name))
         if pairs:
             if not isinstance(pairs, list):
                 raise TypeError("pairs argument must be a list")
@@ -66,136 +188,449 @@ class Balance:
                 raise TypeError("symmetrical argument must be a list")
 
         self._compile_punctuation_lists(pairs, symmetrical, cjk, straight, custom, german, math)
+        self._compile_skip_rules(skip)
         self._tags = tags
         self._ignore_case = ignore_case
 
-        if tags and (self.TAG_BEGIN in self._openings + self._closings + self._symmetrical or
-                     self.TAG_END in self._openings + self._closings + self._symmetrical):
+        if tags and (self.TAG_BEGIN in self._lines or self.TAG_END in self._lines):
             raise Exception("can't process tags and angle brackets simultaneously")
 
-        self._punctuation_stack = []  # [line, position, type]
-        self._string = None
-
-    def _closing_tag_processing(self, position):
-        if self._string[position + 2] not in self.LATIN_LETTERS:
-            return True, Unbalanced(self._string, 1, position)  # Incomplete tag (not tag name)
-        for i in range(position + 3, len(self._string)):  # Iterating through the tag name
-            if self._string[i] not in self.LATIN_LETTERS:
-                if self._string[i] == self.TAG_END:
-                    if not self._punctuation_stack:
-                        return True, Unbalanced(self._string, 0, 0, i - position + 1, position)
-                    if self._punctuation_stack[-1][2] != self.PUNCTUATION_TYPES['opened-tag']:
-                        return True, Unbalanced(self._string,
-                                          len(self._punctuation_stack[-1][0]), self._punctuation_stack[-1][1],
-                                          i - position + 1, position)
-
-                    tag_opening = self._punctuation_stack[-1][0][1:-1]
-                    tag_closing = self._string[position + 2:i]
-                    if self._ignore_case:
-                        tag_opening = tag_opening.lower()
-                        tag_closing = tag_closing.lower()
-                    if tag_opening == tag_closing:
-                        self._punctuation_stack = self._punctuation_stack[:-1]
-                        return False, i + 1
-                    else:
-                        return True, Unbalanced(self._string,
-                                          len(self._punctuation_stack[-1][0]), self._punctuation_stack[-1][1],
-                                          i - position + 1, position)
-                else:
-                    return True, Unbalanced(self._string, 1, position)  # Incomplete tag
-
-        return True, Unbalanced(self._string, len(self._string) - position, position)  # Incomplete tag (no TAG_END)
-
-    def _tags_iteration(self, position):
-        if self._string[position] == self.TAG_BEGIN:
-            if self._punctuation_stack and self._punctuation_stack[-1][-1] == self.PUNCTUATION_TYPES['incomplete-tag']:
-                return True, Unbalanced(self._string, len(self._punctuation_stack[-1][0]), self._punctuation_stack[-1][1])
-            if self._string[position + 1] == self.TAG_CLOSE:
-                return self._closing_tag_processing(position)
-            elif self._string[position + 1] not in self.LATIN_LETTERS:
-                return True, Unbalanced(self._string, 1, position)  # Incomplete tag
-            else:
-                for i in range(position + 2, len(self._string)):  # Iterating through the tag name
-                    if self._string[i] not in self.LATIN_LETTERS:
-                        self._punctuation_stack.append([self._string[position:i], position,
-                                                        self.PUNCTUATION_TYPES['incomplete-tag']])
-                        return False, i
-                return True, Unbalanced(self._string, 1, position)  # Incomplete tag
-
-        elif self._string[position] == self.TAG_END:
-            if not self._punctuation_stack:
-                return True, Unbalanced(self._string, 0, 0, 1, position)
-
-            last_punctuation = self._punctuation_stack[-1]
-            if last_punctuation[2] == self.PUNCTUATION_TYPES['incomplete-tag']:
-                if self._string[position - 1] == self.TAG_CLOSE:  # Self-closing tag, e.g. <something/>
-                    self._punctuation_stack = self._punctuation_stack[:-1]
-                    return False, position + 1
-                else:
-                    if last_punctuation[0][1:].lower() in self.UNPAIRED_TAGS:
-                        self._punctuation_stack = self._punctuation_stack[:-1]
-                        return False, position + 1
-                    else:
-                        self._punctuation_stack[-1] = [last_punctuation[0] + self.TAG_END, last_punctuation[1],
-                                                       self.PUNCTUATION_TYPES['opened-tag']]
-                        return False, position + 1
-            else:
-                return True, Unbalanced(self._string, len(self._punctuation_stack[-1][0]),
-                                        self._punctuation_stack[-1][1], 1, position)
+        self._engine = engine
+        self._max_depth = max_depth
+        self._max_input_length = max_input_length
+        self._timeout = timeout
+        self._compile()
+
+    def _compile(self):
+        # Everything derived from the validated and sorted parameters, for the constructor and for loads()
+        self._unpaired_tags = frozenset(self.UNPAIRED_TAGS)
+        self._max_length = max([len(line) for line in self._lines] + [len(start) for start in self._skip_starts] or [0])
+        self._lookahead = max(1, self._max_length)  # The text after a position which may change the scan before it
+        if any(not isinstance(end, str) for end in self._skip_ends.values()):
+            self._lookahead += self.SKIP_PATTERN_LOOKAHEAD
+        self._limited = self._max_depth is not None or self._max_input_length is not None or self._timeout is not None
+        self._vectorized = None
+        if self._engine == 'numpy':
+            from strbalance.vectorized import VectorizedChecker  # NumPy is optional
+            self._vectorized = VectorizedChecker(self)
+
+        self._stream = None  # Scanner used by feed() and finish()
+        self._encoded = None  # EncodedBalance used by is_unbalanced_bytes(), compiled on the first call
+
+    def __getattr__(self, name):
+        # The prefix tree, the patterns, the ids of is_balanced() and the generated scan are compiled on first use:
+        # Balance objects which never need them (the trie with the 'regex' engine, the tag pattern without tags) cost
+        # less to create and load
+        if name == '_trie':
+            self._trie = self._compile_trie()
+        elif name in ('_line_ids', '_id_closings'):
+            self._line_ids, self._id_closings = self._compile_line_ids()
+        elif name in ('_pattern', '_pattern_kinds'):
+            self._pattern, self._pattern_kinds = self._compile_pattern()
+        elif name == '_tag_pattern':
+            self._tag_pattern = self._compile_tag_pattern()
+        elif name == '_generated_scan':
+            from strbalance.generated import scan_function  # Only for the 'generated' engine
+            self._generated_scan = scan_function(self)
+        else:
+            raise AttributeError("'{}' object has no attribute '{}'".format(type(self).__name__, name))
+        return self.__dict__[name]
+
+    def __getstate__(self):
+        # Only the compiled parameters, as loads() takes them: the rest is compiled again where the object is loaded
+        # (the generated scan function can't be pickled at all), and the text passed to feed() is not copied
+        return {name: value for name, value in self.__dict__.items() if name not in self._DERIVED_ATTRIBUTES}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._compile()
+
+    def dumps(self):
+        """Return the compiled balancing parameters as a compact bytes object (UTF-8 encoded JSON).
+
+        loads() turns it back into a Balance object equal to this one without validating and sorting the parameters
+        again. The format is independent of the Python version, so the data can be stored in a file and shipped to
+        other machines.
+        """
+        import json  # Only for serialization
+        skip = [[start, end if isinstance(end, str) else {'pattern': end.pattern, 'flags': end.flags}]
+                for start, end in self._skip_ends.items()]
+        parameters = {'format': self.DUMP_FORMAT, 'pairs': self._pairs, 'openings': self._openings,
+                      'closings': self._closings, 'symmetrical': self._symmetrical,
+                      'closing_openings': {closing: sorted(openings) for closing, openings in
+                                           self._closing_openings.items()},
+                      'skip': skip, 'skip_starts': self._skip_starts, 'tags': self._tags,
+                      'ignore_case': self._ignore_case, 'engine': self._engine, 'max_depth': self._max_depth,
+                      'max_input_length': self._max_input_length, 'timeout': self._timeout}
+        return json.dumps(parameters, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    @classmethod
+    def loads(cls, data):
+        """Return a Balance object with the compiled balancing parameters returned by dumps().
+
+        The data is trusted to come from dumps(): it is not validated beyond its format, which must be DUMP_FORMAT.
+        """
+        import json  # Only for serialization
+        parameters = json.loads(data)
+        if not isinstance(parameters, dict) or parameters.get('format') != cls.DUMP_FORMAT:
+            raise ValueError('data must be returned by Balance.dumps() of format {}'.format(cls.DUMP_FORMAT))
+
+        balance = cls.__new__(cls)
+        balance._pairs = parameters['pairs']
+        balance._openings = parameters['openings']
+        balance._closings = parameters['closings']
+        balance._symmetrical = parameters['symmetrical']
+        balance._closing_openings = {closing: set(openings)
+                                     for closing, openings in parameters['closing_openings'].items()}
+        balance._lines = set(balance._openings + balance._closings + balance._symmetrical)
+        balance._skip_ends = {}
+        for start, end in parameters['skip']:
+            if not isinstance(end, str):
+                import re  # Only for the end patterns of skip rules
+                end = re.compile(end['pattern'], end['flags'])
+            balance._skip_ends[start] = end
+        balance._skip_starts = parameters['skip_starts']
+        balance._tags = parameters['tags']
+        balance._ignore_case = parameters['ignore_case']
+        balance._engine = parameters['engine']
+        balance._max_depth = parameters['max_depth']
+        balance._max_input_length = parameters['max_input_length']
+        balance._timeout = parameters['timeout']
+        balance._compile()
+        return balance
+
+    def _trie_search(self, string, position, limit):
+        # Walks the trie along the string from every position before the limit; each node already holds the best
+        # match among the prefixes of its path, so the first node with a match gives the punctuation at this position.
+        trie = self._trie
+        length = len(string)
+        while position < limit:
+            node = trie.get(string[position])
+            if node is not None:
+                best = node[None]
+                end = min(length, position + self._max_length)
+                index = position + 1
+                while index < end:
+                    node = node.get(string[index])
+                    if node is None:
+                        break
+                    best = node[None]
+                    index += 1
+                if best is not None:
+                    return position, best[0], best[1]
+            position += 1
+        return None
+
+    def _read_tag(self, string, position):
+        """Read the tag beginning with TAG_BEGIN at the position and return (token, end, value).
+
+        token is one of TAG_TOKENS and end is the position after the tag. For opening and closing tags, value is the
+        stack line: the name (case-folded with ignore_case) between TAG_BEGIN and TAG_END, interned; void elements and
+        self-closing tags are skipped. For an incomplete tag, end is the position where reading stopped (the length of
+        the string if the tag may continue beyond it), and value is the length of its unclosed beginning.
+        """
+        tokens = self.TAG_TOKENS
+        match = self._tag_pattern.match(string, position)
+        if match is not None:
+            end = match.end()
+            name = match.group(1)
+            if name is not None:
+                if string[end - 2:end - 1] == self.TAG_CLOSE or name.lower() in self._unpaired_tags:
+                    return tokens['skipped'], end, None
+                return tokens['opening'], end, self._tag_line(name)
+            name = match.group(2)
+            if name is not None:
+                return tokens['closing'], end, self._tag_line(name)
+            return tokens['skipped'], end, None
+
+        # Incomplete tags
+        length = len(string)
+        if string[position:position + 2] == self.TAG_BEGIN + self.TAG_CLOSE:
+            match = self.CLOSING_TAG_PATTERN.match(string, position)
+            if match is None:
+                return tokens['incomplete'], position + 2, 1
+            if match.end() == length:
+                return tokens['incomplete'], length, length - position
+            return tokens['incomplete'], match.end(), 1
+        for beginning, _ in self.SPECIAL_TAGS:
+            if string[position:position + len(beginning)] == beginning:
+                return tokens['incomplete'], length, len(beginning)
+        match = self.OPENING_TAG_PATTERN.match(string, position)
+        if match is None:
+            return tokens['incomplete'], position + 1, 1
+        end = match.end()  # The end of the string, a quote without pair or TAG_BEGIN
+        return tokens['incomplete'], end if string[end:end + 1] == self.TAG_BEGIN else length, match.end(1) - position
+
+    def _tag_line(self, name):
+        if self._ignore_case:
+            name = name.lower()
+        return sys.intern(self.TAG_BEGIN + name + self.TAG_END)
+
+    def _skip_end(self, string, position, start, final):
+        """Return the end of the skipped region beginning with the start at the position.
+
+        Unless final, return None if the region may end beyond the string: its end is not found or there are fewer
+        than SKIP_PATTERN_LOOKAHEAD characters after the pattern match, which might change with more text.
+        """
+        end = self._skip_ends[start]
+        position += len(start)
+        if isinstance(end, str):
+            index = string.find(end, position)
+            if index >= 0:
+                return index + len(end)
+        else:
+            match = end.search(string, position)
+            if match is not None and (final or match.end() + self.SKIP_PATTERN_LOOKAHEAD < len(string)):
+                return match.end()
+        return len(string) if final else None
+
+    def _regex_search(self, string, position, limit):
+        # Punctuation starting before the limit ends before limit + self._max_length
+        match = self._pattern.search(string, position, limit + self._max_length)
+        if match is None or match.start() >= limit:
+            return None
+        return match.start(), self._pattern_kinds[match.lastindex], match.group()
+
+    def stream(self):
+        """Return a new Scanner for a text split into chunks (see help(Scanner) for more details)."""
+        return Scanner(self, streaming=True)
+
+    def incremental(self, text=''):
+        """Return a new IncrementalScanner which checks the text again after every edit from the last checkpoint before
+        the edit (see help(IncrementalScanner) for more details)."""
+        return IncrementalScanner(self, text)
+
+    def is_unbalanced(self, string, stats=None):
+        """Check if the string is balanced and return None or an Unbalanced object.
+
+        With stats, a ScanStats object, the work of the scan is added to its counters (see help(ScanStats)); the
+        'numpy' engine then scans the string without the bulk check. Without it, the scan has no counters at all.
+        """
+        if not isinstance(string, str):
+            raise TypeError("first argument must be string")
 
-        return False, position + 1  # Not tags found
+        if stats is not None:
+            return InstrumentedScanner(self, string, stats).scan()
+        if self._vectorized is not None and not self._limited and len(string) >= self.VECTORIZED_MIN_LENGTH and \
+                self._vectorized.is_balanced(string):
+            return None
+        if self._engine == 'generated' and not self._limited:
+            result = self._generated_scan(string, self)
+            return None if result is None else Unbalanced(string, *result)
+        return Scanner(self, string).scan()
+
+    def is_balanced(self, string):
+        """Check if the string is balanced and return True or False.
+
+        The result is the same as of is_unbalanced(string) is None, but the check keeps only the ids of the stacked
+        punctuation, without their positions, and stops at the first unbalanced element without building a result.
+        It serves as a pre-filter: only the strings which fail it need is_unbalanced() to find out what's wrong.
+        Every engine jumps from one punctuation element to the next with the pattern of 'regex' here, except that
+        'numpy' checks long strings in bulk. With limits, the string is scanned as by is_unbalanced().
+        """
+        if not isinstance(string, str):
+            raise TypeError("first argument must be string")
 
-    def _iteration_on_string(self, position):
-        if position >= len(self._string):  # String ended
-            if not self._punctuation_stack:
-                return True, None
-            else:
-                return True, Unbalanced(self._string, len(self._punctuation_stack[-1][0]),
-                                        self._punctuation_stack[-1][1])
-
-        for closing in self._closings:
-            if self._string[position:position + len(closing)] == closing:
-                if self._punctuation_stack:
-                    if [self._punctuation_stack[-1][0], closing] in self._pairs:
-                        self._punctuation_stack = self._punctuation_stack[:-1]
-                        return False, position + len(closing)
+        if self._limited:
+            return Scanner(self, string).scan() is None
+        if self._vectorized is not None and len(string) >= self.VECTORIZED_MIN_LENGTH:
+            return self._vectorized.is_balanced(string)
+
+        kinds = self._pattern_kinds
+        ids = self._line_ids
+        closings = self._id_closings
+        closing_kind = self.PUNCTUATION_KINDS['closing']
+        symmetrical_kind = self.PUNCTUATION_KINDS['symmetrical']
+        opening_kind = self.PUNCTUATION_KINDS['opening']
+        skip_kind = self.PUNCTUATION_KINDS['skip']
+        tokens = self.TAG_TOKENS
+        stack = []  # Ids of the stacked punctuation and stack lines of the opened tags
+        position = 0
+        while True:
+            for match in self._pattern.finditer(string, position):
+                kind = kinds[match.lastindex]
+                if kind == closing_kind:
+                    line_id = ids[match.group()]
+                    if not stack or stack[-1] not in closings[line_id]:
+                        return False
+                    stack.pop()
+                elif kind == opening_kind:
+                    stack.append(ids[match.group()])
+                elif kind == symmetrical_kind:
+                    line_id = ids[match.group()]
+                    if stack and stack[-1] == line_id:
+                        stack.pop()
                     else:
-                        return True, Unbalanced(self._string, len(self._punctuation_stack[-1][0]),
-                                          self._punctuation_stack[-1][1], len(closing), position)
-                return True, Unbalanced(self._string, 0, 0, len(closing), position)   # empty stack
-
-        for symmetrical in self._symmetrical:
-            if self._string[position:position + len(symmetrical)] == symmetrical:
-                if len(self._punctuation_stack) and self._punctuation_stack[-1][0] == symmetrical:
-                    self._punctuation_stack = self._punctuation_stack[:-1]
-                else:
-                    self._punctuation_stack.append([symmetrical, position, self.PUNCTUATION_TYPES['non-tag']])
-                return False, position + len(symmetrical)
-
-        for opening in self._openings:
-            if self._string[position:position + len(opening)] == opening:
-                self._punctuation_stack.append([opening, position, self.PUNCTUATION_TYPES['non-tag']])
-                return False, position + len(opening)
-
-        if self._tags:
-            return self._tags_iteration(position)
-
-        return False, position + 1
-
-    def is_unbalanced(self, string):
-        """Check if the string is balanced and return None or an Unbalanced object."""
+                        stack.append(line_id)
+                elif kind == skip_kind:  # The search goes on after the region
+                    position = self._skip_end(string, match.start(), match.group(), True)
+                    break
+                else:  # Tags, read from TAG_BEGIN; the search goes on after the tag
+                    if match.group() == self.TAG_END:
+                        return False
+                    token, position, value = self._read_tag(string, match.start())
+                    if token == tokens['opening']:
+                        stack.append(value)
+                    elif token == tokens['closing']:
+                        if not stack or stack[-1] != value:
+                            return False
+                        stack.pop()
+                    elif token == tokens['incomplete']:
+                        return False
+                    break
+            else:
+                return not stack
+
+    def is_unbalanced_bytes(self, data):
+        """Check if the UTF-8 encoded text is balanced and return None or a BytesUnbalanced object.
+
+        data is a bytes, bytearray, memoryview or mmap object. It is scanned as it is, without decoding or copying:
+        the punctuation is looked for in its UTF-8 encoded form, which is the same bytes for ASCII. The data is not
+        validated. Positions and lengths in the result are counted in bytes; its decoded() method converts them to
+        characters.
+        """
+        if isinstance(data, memoryview):
+            data = data.cast('B')
+        elif not isinstance(data, (bytes, bytearray, mmap.mmap)):
+            raise TypeError("first argument must be bytes, bytearray, memoryview or mmap")
+
+        if self._encoded is None:
+            self._encoded = EncodedBalance(self)
+        unbalanced = Scanner(self._encoded, data).scan()
+        if unbalanced is None:
+            return None
+        return BytesUnbalanced(data, unbalanced.opening_length, unbalanced.opening_position,
+                               unbalanced.closing_length, unbalanced.closing_position)
+
+    def find_all(self, string):
+        """Check the string in one pass and yield an Unbalanced object for every unbalanced element in it.
+
+        The first result is the one returned by is_unbalanced(). The check then goes on as follows:
+            - a closing element with nothing to close is skipped;
+            - a closing element which doesn't match the last opened one closes the nearest matching element opened
+              before it, and all elements opened after that one are reported as not closed; if there is no matching
+              element, the closing one is skipped;
+            - the first character of an incomplete tag is skipped;
+            - all elements left open at the end of the string are reported, the last opened first.
+        Results are produced lazily, so the check stops as soon as the caller stops iterating.
+        """
         if not isinstance(string, str):
             raise TypeError("first argument must be string")
 
-        self._string = string
-        self._punctuation_stack = []
+        return RecoveringScanner(self, string).find_all()
 
-        finished, intermediate_result = self._iteration_on_string(0)
+    def find_pairs(self, string):
+        """Check the string in one pass and return a PairTable of all pairs matched in it.
 
-        while not finished:
-            finished, intermediate_result = self._iteration_on_string(intermediate_result)
+        The table holds every pair as its closing element is found, in columns of array('l'): the positions and the
+        lengths of the opening and the closing elements, the nesting depth and the id of the opening element (see
+        help(PairTable)). Its unbalanced attribute is None or the result of is_unbalanced(); the check stops there, as
+        is_unbalanced() does, and so do the limits.
+        """
+        if not isinstance(string, str):
+            raise TypeError("first argument must be string")
 
-        return intermediate_result
+        return find_pairs(self, string)
+
+    def feed(self, chunk):
+        """Check the next chunk of a text split into pieces of arbitrary size.
+
+        Return the Unbalanced object as soon as the text checked so far is found out to be unbalanced, None otherwise.
+        Positions in the result are counted from the beginning of the whole text. Only the unchecked tail of the text
+        and short context around the stacked punctuation are kept between the calls.
+        Call finish() after the last chunk to get the final result and to start a new text.
+
+        The text is kept by the Balance object, so feed() and finish() are not meant for concurrent use; stream()
+        returns an independent Scanner with the same methods.
+        """
+        if self._stream is None:
+            self._stream = self.stream()
+        return self._stream.feed(chunk)
+
+    def finish(self):
+        """Finish the text passed to feed() and return None if it is balanced or an Unbalanced object otherwise."""
+        if self._stream is None:
+            self._stream = self.stream()
+        return self._stream.finish()
+
+    def is_unbalanced_chunks(self, chunks):
+        """Check the text given as an iterable of strings (e.g. a text file) chunk by chunk."""
+        return self.stream().is_unbalanced_chunks(chunks)
+
+    def check_many(self, strings, workers=0, chunksize=1000):
+        """Check every string of an iterable and yield None or an Unbalanced object for each of them in order.
+
+        With workers=0 the strings are checked in the current process. Otherwise they are sent in lists of chunksize
+        strings to a pool of that many worker processes (None for the number of CPUs); every worker receives this
+        Balance once and returns only the positions of unbalanced strings. The input is consumed lazily, with a few
+        lists per worker in flight.
+        """
+        if chunksize < 1:
+            raise ValueError("chunksize must be >= 1")
+        if not workers and workers is not None:
+            return (self.is_unbalanced(string) for string in strings)
+        from strbalance import batch  # Imports the process pool only when needed
+        return batch.check_many(self, strings, workers, chunksize)
+
+    def is_unbalanced_parallel(self, string, workers=None, chunk_size=None):
+        """Check one long string in chunks in a pool of worker processes and return the same result as is_unbalanced().
+
+        The string is split into chunks of about chunk_size characters (PARALLEL_CHUNK_SIZE by default) right after
+        characters which belong to no punctuation, every worker reduces its chunks to the punctuation they leave
+        unmatched, and the results are merged in the current process (see help(strbalance.parallel)). workers is the
+        number of processes (None for the number of CPUs, 0 to reduce the chunks in the current process). With skip
+        rules, the string is checked by is_unbalanced(), since a chunk may begin inside a skipped region, and so it is
+        with max_depth, since the depth of the stack in a chunk is known only after the chunks before it are merged.
+        max_input_length is checked against the whole string before it is split.
+        """
+        if not isinstance(string, str):
+            raise TypeError("first argument must be string")
+        if self._max_input_length is not None and len(string) > self._max_input_length:
+            raise LimitExceeded('max_input_length', 0, 0)
+        if self._skip_starts or self._max_depth is not None:
+            return self.is_unbalanced(string)
+        from strbalance import parallel  # Imports the process pool only when needed
+        return parallel.is_unbalanced(self, string, workers, chunk_size or self.PARALLEL_CHUNK_SIZE)
+
+    def check_file(self, path, chunk_size=None):
+        """Check the UTF-8 text file at the path and return None if it is balanced or a FileUnbalanced object.
+
+        The file is memory-mapped and decoded chunk by chunk (FILE_CHUNK_SIZE bytes by default), so the whole text is
+        never held in memory. The result reports character positions as is_unbalanced() does as well as byte
+        positions, and decodes the context for its summaries from the file when they are requested.
+        """
+        chunk_size = chunk_size or self.FILE_CHUNK_SIZE
+        with open(path, 'rb') as file:
+            size = os.fstat(file.fileno()).st_size
+            mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        checkpoints = [(0, 0)]  # (character position, byte position) of character boundaries at chunk ends
+        length = 0
+        scanner = self.stream()
+        try:
+            for start in range(0, size, chunk_size):
+                end = min(size, start + chunk_size)
+                text = decoder.decode(mapping[start:end], final=end == size)
+                length += len(text)
+                checkpoints.append((length, end - len(decoder.getstate()[0])))
+                if scanner.feed(text) is not None:
+                    break
+            else:
+                checkpoints[-1] = (length, size)
+            unbalanced = scanner.finish()
+        except BaseException:  # Invalid UTF-8, exceeded limits or an interruption
+            if size:
+                mapping.close()
+            raise
+
+        if unbalanced is None:
+            if size:
+                mapping.close()
+            return None
+        text = MappedText(mapping, checkpoints, length if checkpoints[-1][1] == size else None)
+        return FileUnbalanced(text, unbalanced.opening_length, unbalanced.opening_position,
+                              unbalanced.closing_length, unbalanced.closing_position)
 
     def _compile_punctuation_lists(self, pairs, symmetrical, cjk, straight, custom, german, math):
         self._pairs = []
@@ -238,10 +673,210 @@ class Balance:
         self._openings = sorted(list(set([pair[0] for pair in self._pairs])), key=len, reverse=True)
         self._symmetrical = sorted(list(set(self._symmetrical)), key=len, reverse=True)
 
+        openings = set(self._openings)
+        closings = set(self._closings)
         for symmetrical in self._symmetrical:
-            if symmetrical in self._openings or symmetrical in self._closings:
+            if symmetrical in openings or symmetrical in closings:
                 raise ValueError('{} found both in symmetrical and in pairs'.format(symmetrical))
 
         for opening in self._openings:
-            if opening in self._closings:
+            if opening in closings:
                 raise ValueError('{} found both as opening and as closing sequence'.format(opening))
+
+        self._closing_openings = {closing: set() for closing in self._closings}
+        for opening, closing in self._pairs:
+            self._closing_openings[closing].add(opening)
+
+        self._lines = set(self._openings + self._closings + self._symmetrical)
+
+    def _compile_skip_rules(self, skip):
+        self._skip_ends = {}
+        if skip:
+            import re  # Only for the end patterns of skip rules
+            if not isinstance(skip, list):
+                raise TypeError("skip argument must be a list")
+            for rule in skip:
+                if len(rule) != 2:
+                    raise ValueError('skip rules must contain two elements each')
+                start, end = rule
+                if not isinstance(start, str) or not start:
+                    raise ValueError('skip rules must begin with a non-empty string')
+                if not (isinstance(end, str) and end or isinstance(end, re.Pattern) and isinstance(end.pattern, str)):
+                    raise ValueError('skip rules must end with a non-empty string or a compiled pattern')
+                if start in self._lines:
+                    raise ValueError('{} found both in skip rules and in punctuation'.format(start))
+                self._skip_ends.setdefault(start, end)  # The first rule for the start wins
+
+        self._skip_starts = sorted(self._skip_ends, key=len, reverse=True)
+
+    def _compile_trie(self):
+        # Each node maps a character to the next node; the None key holds the best (kind, line) match among the
+        # prefixes of the node: closings win over symmetrical and openings, a longer line wins within the same kind.
+        trie = {None: None}
+        for kind, lines in ((self.PUNCTUATION_KINDS['tag'], [self.TAG_BEGIN, self.TAG_END] if self._tags else []),
+                            (self.PUNCTUATION_KINDS['opening'], self._openings),
+                            (self.PUNCTUATION_KINDS['symmetrical'], self._symmetrical),
+                            (self.PUNCTUATION_KINDS['closing'], self._closings),
+                            (self.PUNCTUATION_KINDS['skip'], self._skip_starts)):
+            for line in lines:
+                node = trie
+                for char in line:
+                    node = node.setdefault(char, {None: None})
+                node[None] = (kind, line)
+
+        self._propagate_trie_matches(trie, None)
+        return trie
+
+    def _propagate_trie_matches(self, node, best):
+        if node[None] is None or (best is not None and best[0] > node[None][0]):
+            node[None] = best
+        for char, child in node.items():
+            if char is not None:
+                self._propagate_trie_matches(child, node[None])
+
+    def _compile_pattern(self):
+        # One group per kind, tried in the order of precedence: the regex alternation takes the first alternative
+        # matching at the left-most position, which reproduces the trie lookup. The skip group goes first, the tag
+        # group last.
+        import re
+        groups = []
+        kinds = [None]  # Group numbers start with 1
+        for kind, lines in ((self.PUNCTUATION_KINDS['skip'], self._skip_starts),
+                            (self.PUNCTUATION_KINDS['closing'], self._closings),
+                            (self.PUNCTUATION_KINDS['symmetrical'], self._symmetrical),
+                            (self.PUNCTUATION_KINDS['opening'], self._openings)):
+            if lines:
+                groups.append('(' + '|'.join(re.escape(line) for line in lines) + ')')
+                kinds.append(kind)
+        if self._tags:
+            groups.append('(' + re.escape(self.TAG_BEGIN) + '|' + re.escape(self.TAG_END) + ')')
+            kinds.append(self.PUNCTUATION_KINDS['tag'])
+
+        if not groups:
+            return re.compile('(?!)'), kinds  # Never matches
+        return re.compile('|'.join(groups)), kinds
+
+    def _compile_line_ids(self):
+        # Ids of the lines for Balance.is_balanced() in the order of the sorted lines, starting with 1, and the ids of
+        # the openings closed by every closing id
+        ids = {line: index for index, line in enumerate(sorted(self._lines), 1)}
+        closings = [None] * (len(ids) + 1)
+        for closing, openings in self._closing_openings.items():
+            closings[ids[closing]] = frozenset(ids[opening] for opening in openings)
+        return ids, closings
+
+    def _compile_tag_pattern(self):
+        # Matches complete tags only: an opening tag (group 1 is the name), a closing tag (group 2) or a special tag;
+        # a special tag is not taken for one listed before it in SPECIAL_TAGS
+        import re
+        alternatives = [self.OPENING_TAG_PATTERN.pattern + re.escape(self.TAG_END),
+                        self.CLOSING_TAG_PATTERN.pattern + re.escape(self.TAG_END)]
+        for index, (beginning, ending) in enumerate(self.SPECIAL_TAGS):
+            exclusions = ''.join('(?!' + re.escape(previous) + ')' for previous, _ in self.SPECIAL_TAGS[:index])
+            alternatives.append(exclusions + re.escape(beginning) + '.*?' + re.escape(ending))
+        return re.compile('|'.join(alternatives), re.DOTALL)
+
+
+class EncodedBalance(Balance):
+    """The compiled parameters of a Balance object encoded in UTF-8, used by Balance.is_unbalanced_bytes().
+
+    Scanners of bytes-like objects work with it as with the Balance of a string: the stack holds the encoded lines and
+    all positions and lengths are counted in bytes. UTF-8 is self-synchronizing, so an encoded line is never found in
+    the middle of a character, and the order of precedence is the same as for the string.
+    """
+
+    TAG_BEGIN = Balance.TAG_BEGIN.encode('utf-8')
+    TAG_END = Balance.TAG_END.encode('utf-8')
+    TAG_CLOSE = Balance.TAG_CLOSE.encode('utf-8')
+    TAG_WHITESPACE = Balance.TAG_WHITESPACE.encode('utf-8')
+    SPECIAL_TAGS = [[beginning.encode('utf-8'), ending.encode('utf-8')] for beginning, ending in Balance.SPECIAL_TAGS]
+    SKIP_DECODING_SIZE = 4096  # Bytes decoded first to match the end pattern of a skipped region, doubled as needed
+
+    @_LazyClassAttribute
+    def OPENING_TAG_PATTERN():
+        import re
+        return re.compile(Balance.OPENING_TAG_PATTERN.pattern.encode('utf-8'))
+
+    @_LazyClassAttribute
+    def CLOSING_TAG_PATTERN():
+        import re
+        return re.compile(Balance.CLOSING_TAG_PATTERN.pattern.encode('utf-8'))
+
+    @_LazyClassAttribute
+    def TAG_STOP_PATTERN():
+        import re
+        return re.compile(Balance.TAG_STOP_PATTERN.pattern.encode('utf-8'))
+
+    def __init__(self, balance):
+        """Initialize EncodedBalance with the compiled parameters of the Balance object."""
+        def encode(lines):
+            return [line.encode('utf-8') for line in lines]
+
+        self._pairs = [encode(pair) for pair in balance._pairs]
+        self._openings = encode(balance._openings)
+        self._closings = encode(balance._closings)
+        self._symmetrical = encode(balance._symmetrical)
+        self._closing_openings = {closing.encode('utf-8'): set(encode(openings))
+                                  for closing, openings in balance._closing_openings.items()}
+        self._lines = set(encode(balance._lines))
+        self._skip_starts = encode(balance._skip_starts)
+        self._skip_ends = {start.encode('utf-8'): self._encode_skip_end(end)
+                           for start, end in balance._skip_ends.items()}
+        self._max_length = max([len(line) for line in self._lines | set(self._skip_starts)] or [0])
+        self._lookahead = balance._lookahead
+        self._tags = balance._tags
+        self._ignore_case = balance._ignore_case
+        self._unpaired_tags = frozenset(encode(balance._unpaired_tags))
+
+        # The patterns of the Balance escape only ASCII characters, so they are valid in the encoded form
+        self._engine = balance._engine
+        self._max_depth = balance._max_depth
+        self._max_input_length = balance._max_input_length
+        self._timeout = balance._timeout
+        self._limited = balance._limited
+        self._trie = self._compile_trie()
+        import re
+        self._pattern = re.compile(balance._pattern.pattern.encode('utf-8'))
+        self._pattern_kinds = balance._pattern_kinds
+        self._tag_pattern = re.compile(balance._tag_pattern.pattern.encode('utf-8'), re.DOTALL)
+        self._vectorized = None
+
+        self._stream = None
+        self._encoded = self
+
+    def _tag_line(self, name):
+        if self._ignore_case:
+            name = name.lower()
+        return self.TAG_BEGIN + name + self.TAG_END
+
+    @staticmethod
+    def _encode_skip_end(end):
+        if isinstance(end, str):  # A pattern, as memoryview objects have no find()
+            import re
+            return re.compile(re.escape(end.encode('utf-8')))
+        return end  # Matched in the decoded text, see _skip_end()
+
+    def _skip_end(self, string, position, start, final):
+        """Return the end of the skipped region beginning with the start at the position in the bytes-like object.
+
+        End patterns are matched in the decoded text, so that classes such as \\s match the same characters as in
+        strings. The text is decoded from the position in parts of SKIP_DECODING_SIZE bytes doubled until the match is
+        followed by SKIP_PATTERN_LOOKAHEAD characters or the part reaches the end of the data.
+        """
+        end = self._skip_ends[start]
+        if isinstance(end.pattern, bytes):
+            match = end.search(string, position + len(start))
+            return len(string) if match is None else match.end()
+
+        size = self.SKIP_DECODING_SIZE
+        while True:
+            # Undecodable bytes, including a character split at the end of the part, are kept as they are
+            text = bytes(string[position:position + size]).decode('utf-8', 'surrogateescape')
+            match = end.search(text, len(start.decode('utf-8')))
+            if position + size >= len(string) or \
+                    match is not None and match.end() + self.SKIP_PATTERN_LOOKAHEAD < len(text):
+                break
+            size *= 2
+        if match is None:
+            return len(string)
+        return position + len(text[:match.end()].encode('utf-8', 'surrogateescape'))
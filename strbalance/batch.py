@@ -0,0 +1,59 @@
+"""Checking many strings with one Balance, optionally in a pool of worker processes.
+
+Every worker receives the Balance once, when it starts, and then only lists of strings. It sends back the positions
+of the unbalanced strings only, and the parent process builds Unbalanced objects from the strings it still holds.
+"""
+
+import itertools
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from strbalance.unbalanced import Unbalanced
+
+_worker_balance = None
+
+
+def _initialize_worker(balance):
+    global _worker_balance
+    _worker_balance = balance
+
+
+def _check_chunk(strings):
+    # [(index in the chunk, opening_length, opening_position, closing_length, closing_position)] of unbalanced strings
+    results = []
+    for index, string in enumerate(strings):
+        unbalanced = _worker_balance.is_unbalanced(string)
+        if unbalanced is not None:
+            results.append((index, unbalanced.opening_length, unbalanced.opening_position,
+                            unbalanced.closing_length, unbalanced.closing_position))
+    return results
+
+
+def _chunks(strings, chunksize):
+    iterator = iter(strings)
+    while True:
+        chunk = list(itertools.islice(iterator, chunksize))
+        if not chunk:
+            return
+        yield chunk
+
+
+def check_many(balance, strings, workers, chunksize):
+    """Yield None or an Unbalanced object for every string in the input order, checking them in worker processes."""
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(workers, initializer=_initialize_worker, initargs=(balance,)) as executor:
+        pending = deque()  # (chunk, future) in the input order; at most a few chunks per worker are in flight
+        for chunk in _chunks(strings, chunksize):
+            pending.append((chunk, executor.submit(_check_chunk, chunk)))
+            if len(pending) >= 4 * workers:
+                yield from _chunk_results(*pending.popleft())
+        while pending:
+            yield from _chunk_results(*pending.popleft())
+
+
+def _chunk_results(chunk, future):
+    results = [None] * len(chunk)
+    for index, opening_length, opening_position, closing_length, closing_position in future.result():
+        results[index] = Unbalanced(chunk[index], opening_length, opening_position, closing_length, closing_position)
+    return results
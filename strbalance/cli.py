@@ -0,0 +1,278 @@
+"""Command-line interface: checking UTF-8 text files and directory trees.
+
+Usage: strbalance [options] path ...   (installed as a console script; also python -m strbalance)
+
+Directories are walked recursively in sorted order, skipping hidden files and directories (those starting with a
+dot); --pattern limits the files found in directories to the names matching any of the patterns. Files given
+explicitly are always checked. The files are checked with Balance.check_file(), which never reads a file whole, in
+the current process or in a pool of worker processes (--workers), every one of which receives the Balance object
+once, and the results are printed in the order of the files as they arrive: as text lines (path:line:column: message)
+or as JSON lines (--format json). Only unbalanced files and errors are printed unless --all is given.
+
+With --cache, the results are kept in a JSON file by the SHA-256 hash of the content of every file and by the
+balancing parameters (and the version of the package), so files which haven't changed since the last run are not
+checked again. Only the results of the files of the last run are kept for its parameters.
+
+Exit codes: 0 if all files are balanced, 1 if any file is unbalanced, 2 if any file couldn't be read or decoded or
+exceeded a limit (or the arguments are wrong).
+"""
+
+import argparse
+import collections
+import fnmatch
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from strbalance.balance import Balance
+from strbalance.scanner import LimitExceeded
+from strbalance.strbalance import __version__
+
+BALANCED, UNBALANCED, ERROR = range(3)  # Exit codes
+CACHE_FORMAT = 1
+HASH_CHUNK_SIZE = 1 << 20
+
+_worker_balance = None
+
+
+def _parser():
+    parser = argparse.ArgumentParser(prog='strbalance', description='Check whether brackets, quotation marks, tags '
+                                     'etc. in UTF-8 text files are balanced.')
+    parser.add_argument('paths', nargs='+', metavar='path', help='file or directory to check recursively')
+    parser.add_argument('--version', action='version', version='%(prog)s ' + __version__)
+
+    group = parser.add_argument_group('balancing parameters (see help(strbalance.Balance))')
+    group.add_argument('--pair', action='append', nargs=2, metavar=('OPENING', 'CLOSING'), dest='pairs',
+                       help='additional pair of characters or sequences to match (repeatable)')
+    group.add_argument('--symmetrical', action='append', metavar='LINE',
+                       help='additional character or sequence with identical opening and closing forms (repeatable)')
+    for flag, description in (('tags', 'match HTML (XML) paired tags'), ('ignore-case', 'ignore case in tags'),
+                              ('cjk', 'include CJK brackets and quotation signs'),
+                              ('straight', 'include straight quotation marks'),
+                              ('custom', 'balance only custom characters and sequences'),
+                              ('german', 'use German quoting convention'),
+                              ('math', 'match parentheses with brackets for [a,c) notation')):
+        group.add_argument('--' + flag, action='store_true', help=description)
+    group.add_argument('--skip', action='append', nargs=2, metavar=('START', 'END'), dest='skip_rules',
+                       help='start and end of regions which are not checked (repeatable)')
+    for flag, description in (('escapes', 'a backslash and the character after it'),
+                              ('code', 'Markdown code blocks and spans'), ('urls', 'URLs')):
+        group.add_argument('--skip-' + flag, action='store_true', help='skip ' + description)
+    group.add_argument('--engine', choices=Balance.ENGINES, default='trie', help='the way the text is scanned')
+    group.add_argument('--max-depth', type=int, metavar='N', help='maximum depth of the punctuation stack')
+    group.add_argument('--max-input-length', type=int, metavar='N', help='maximum length of a file in characters')
+    group.add_argument('--timeout', type=float, metavar='SECONDS', help='maximum time of the check of a file')
+
+    group = parser.add_argument_group('files and output')
+    group.add_argument('--pattern', action='append', metavar='GLOB',
+                       help='check only files in directories with names matching the pattern (repeatable)')
+    group.add_argument('--workers', type=int, default=0, metavar='N',
+                       help='number of worker processes (0 to check in the current process, the default)')
+    group.add_argument('--format', choices=['text', 'json'], default='text', help='output format')
+    group.add_argument('--all', action='store_true', help='print balanced files too')
+    group.add_argument('--cache', metavar='FILE', help='JSON file with the results of unchanged files')
+    return parser
+
+
+def _configuration(arguments):
+    skip = [list(rule) for rule in arguments.skip_rules or []]
+    for flag, rules in ((arguments.skip_escapes, Balance.SKIP_ESCAPES), (arguments.skip_code, Balance.SKIP_CODE),
+                        (arguments.skip_urls, Balance.SKIP_URLS)):
+        if flag:
+            skip.extend(rules)
+    return {'pairs': arguments.pairs, 'symmetrical': arguments.symmetrical, 'tags': arguments.tags,
+            'ignore_case': arguments.ignore_case, 'cjk': arguments.cjk, 'straight': arguments.straight,
+            'custom': arguments.custom, 'german': arguments.german, 'math': arguments.math,
+            'engine': arguments.engine, 'max_depth': arguments.max_depth,
+            'max_input_length': arguments.max_input_length, 'timeout': arguments.timeout, 'skip': skip or None}
+
+
+def _paths(paths, patterns):
+    # Files of the paths in order: directories are walked recursively without hidden entries
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for directory, directories, files in os.walk(path):
+            directories[:] = sorted(name for name in directories if not name.startswith('.'))
+            for name in sorted(files):
+                if not name.startswith('.') and (not patterns or any(fnmatch.fnmatch(name, pattern)
+                                                                     for pattern in patterns)):
+                    yield os.path.join(directory, name)
+
+
+def _record(unbalanced):
+    # JSON-serializable result of the check of a file (None or a FileUnbalanced object)
+    if unbalanced is None:
+        return {'balanced': True}
+    text = unbalanced.text
+    record = {'balanced': False, 'opening': None, 'closing': None, 'summary': unbalanced.long_summary}
+    for key, length, position in (('opening', unbalanced.opening_length, unbalanced.opening_position),
+                                  ('closing', unbalanced.closing_length, unbalanced.closing_position)):
+        if length:
+            line, column = text.location(position)
+            record[key] = {'element': text[position:position + length], 'position': position, 'line': line,
+                           'column': column}
+    return record
+
+
+def _initialize_worker(balance):
+    global _worker_balance
+    _worker_balance = balance
+
+
+def _check(path):
+    try:
+        unbalanced = _worker_balance.check_file(path)
+    except (OSError, UnicodeDecodeError, LimitExceeded) as error:
+        return {'error': str(error)}
+    record = _record(unbalanced)
+    if unbalanced is not None:
+        unbalanced.text.close()  # Rather than when the result is collected
+    return record
+
+
+class ResultCache:
+    """Results of the checks of files by the hash of their content for one set of balancing parameters, kept in a
+    JSON file between the runs."""
+
+    def __init__(self, path, configuration):
+        """Initialize ResultCache with the path of the JSON file and the balancing parameters."""
+        self._path = path
+        parameters = {key: value for key, value in configuration.items() if key != 'engine'}  # Same results
+        self._key = json.dumps([__version__, parameters], sort_keys=True,
+                               default=lambda pattern: [pattern.pattern, pattern.flags])  # Patterns of skip rules
+        self._configurations = {}
+        try:
+            with open(path, encoding='utf-8') as file:
+                stored = json.load(file)
+            if stored.get('format') == CACHE_FORMAT:
+                self._configurations = stored['configurations']
+        except (OSError, ValueError, KeyError):  # No cache yet or a broken one
+            pass
+        self._results = self._configurations.get(self._key, {})
+        self._used = {}
+
+    @staticmethod
+    def content_hash(path):
+        """Return the SHA-256 hash of the content of the file or None if it can't be read."""
+        digest = hashlib.sha256()
+        try:
+            with open(path, 'rb') as file:
+                for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+                    digest.update(chunk)
+        except OSError:
+            return None
+        return digest.hexdigest()
+
+    def get(self, content_hash):
+        """Return the result for the content hash or None."""
+        record = self._results.get(content_hash)
+        if record is not None:
+            self._used[content_hash] = record
+        return record
+
+    def put(self, content_hash, record):
+        """Keep the result for the content hash; errors are not kept."""
+        if 'error' not in record:
+            self._used[content_hash] = record
+
+    def save(self):
+        """Write the results of this run for its parameters and the results for other parameters to the file."""
+        self._configurations[self._key] = self._used
+        temporary = self._path + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as file:
+            json.dump({'format': CACHE_FORMAT, 'configurations': self._configurations}, file)
+        os.replace(temporary, self._path)
+
+
+def _format(path, record, output_format):
+    if output_format == 'json':
+        return json.dumps(dict(path=path, **record), ensure_ascii=False)
+    if 'error' in record:
+        return '{}: error: {}'.format(path, record['error'])
+    if record['balanced']:
+        return '{}: balanced'.format(path)
+
+    opening, closing = record['opening'], record['closing']
+    summary = record['summary'].replace('\r', '\\r').replace('\n', '\\n')
+    if opening and closing:
+        return "{}:{}:{}: '{}' is closed by '{}' at {}:{}: {}".format(
+            path, opening['line'], opening['column'], opening['element'], closing['element'], closing['line'],
+            closing['column'], summary)
+    if opening:
+        return "{}:{}:{}: '{}' is not closed: {}".format(path, opening['line'], opening['column'],
+                                                        opening['element'], summary)
+    return "{}:{}:{}: '{}' is not opened: {}".format(path, closing['line'], closing['column'], closing['element'],
+                                                    summary)
+
+
+def _results(balance, paths, cache, workers):
+    # (path, record) for every path in order as soon as the records of the path and of all paths before it are known;
+    # the files which are not in the cache are checked
+    pending = collections.deque()  # (path, content hash, record or its future)
+    if not workers:
+        _initialize_worker(balance)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(workers, initializer=_initialize_worker, initargs=(balance,))
+    try:
+        for path in paths:
+            content_hash = record = None
+            if cache is not None:
+                content_hash = cache.content_hash(path)
+                if content_hash is not None:
+                    record = cache.get(content_hash)
+            if record is None:
+                record = _check(path) if executor is None else executor.submit(_check, path)
+            pending.append((path, content_hash, record))
+            yield from _finished(pending, cache, wait=False)
+        yield from _finished(pending, cache, wait=True)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+def _finished(pending, cache, wait):
+    # Yields (path, record) from the beginning of the pending checks while their records are known or waited for
+    while pending:
+        path, content_hash, record = pending[0]
+        if not isinstance(record, dict):
+            if not wait and not record.done():
+                return
+            record = record.result()
+        pending.popleft()
+        if cache is not None and content_hash is not None:
+            cache.put(content_hash, record)
+        yield path, record
+
+
+def main(argv=None):
+    """Run the command line with the arguments (sys.argv[1:] by default) and return the exit code."""
+    parser = _parser()
+    arguments = parser.parse_args(argv)
+    configuration = _configuration(arguments)
+    try:
+        balance = Balance(**configuration)
+    except Exception as error:  # Wrong balancing parameters
+        parser.error(str(error))
+    if arguments.workers < 0:
+        parser.error('the number of workers must not be negative')
+
+    cache = ResultCache(arguments.cache, configuration) if arguments.cache else None
+    status = BALANCED
+    try:
+        for path, record in _results(balance, _paths(arguments.paths, arguments.pattern), cache,
+                                     arguments.workers):
+            if 'error' in record:
+                status = ERROR
+            elif not record['balanced']:
+                status = max(status, UNBALANCED)
+            elif not arguments.all:
+                continue
+            print(_format(path, record, arguments.format), flush=True)
+    finally:
+        if cache is not None:
+            cache.save()
+    return status
@@ -0,0 +1,202 @@
+import bisect
+import codecs
+
+from strbalance.unbalanced import Unbalanced
+
+CONTINUATION_BYTES = bytes(range(0x80, 0xc0))
+
+
+def _count_characters(data, start, end):
+    # The number of UTF-8 encoded characters between the byte positions
+    characters = 0
+    for chunk_start in range(start, end, MappedText.DECODING_CHUNK_SIZE):
+        chunk = bytes(data[chunk_start:min(end, chunk_start + MappedText.DECODING_CHUNK_SIZE)])
+        characters += len(chunk.translate(None, CONTINUATION_BYTES))
+    return characters
+
+
+class MappedText:
+    """The text of a memory-mapped UTF-8 file or another bytes-like object, decoded only in the parts which are sliced.
+
+    Supports len() and slicing without step like str. Character positions are translated to byte positions with the
+    help of checkpoints recorded while the file was decoded, so a slice costs at most the decoding of the bytes between
+    two checkpoints plus the slice itself. A slice longer than MAX_SLICE_LENGTH characters is shortened to its
+    beginning and its end joined with GAP.
+
+    Class constants:
+        MAX_SLICE_LENGTH        Maximum number of characters decoded for a single slice.
+        GAP                     The replacement for the middle of a shortened slice.
+        DECODING_CHUNK_SIZE     Number of bytes decoded at once while looking for a position.
+    """
+
+    MAX_SLICE_LENGTH = 4096
+    GAP = '...'
+    DECODING_CHUNK_SIZE = 1 << 16
+
+    def __init__(self, mapping, checkpoints, length=None):
+        """Initialize MappedText with the mapping, a sorted list of (character position, byte position) pairs of
+        character boundaries (starting with (0, 0)) and the length in characters if it is known."""
+        self._mapping = mapping
+        self._checkpoints = checkpoints
+        self._character_positions = [checkpoint[0] for checkpoint in checkpoints]
+        self._length = length
+
+    def __len__(self):
+        if self._length is None:
+            characters, start = self._checkpoints[-1]
+            self._length = characters + _count_characters(self._mapping, start, len(self._mapping))
+        return self._length
+
+    def byte_position(self, position):
+        """Return the byte position of the character at the given position (or the size for the end of the text)."""
+        characters, start = self._checkpoints[bisect.bisect_right(self._character_positions, position) - 1]
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        while characters < position:
+            chunk = self._mapping[start:start + self.DECODING_CHUNK_SIZE]
+            if not chunk:
+                break
+            pending = len(decoder.getstate()[0])  # The beginning of a character split by the previous chunk
+            text = decoder.decode(chunk, final=start + len(chunk) >= len(self._mapping))
+            if characters + len(text) >= position:
+                return start - pending + len(text[:position - characters].encode('utf-8'))
+            characters += len(text)
+            start += len(chunk)
+        return start
+
+    def location(self, position):
+        """Return the line and column of the character at the given position, both starting with 1."""
+        end = self.byte_position(position)
+        lines = 0
+        line_start = 0  # Newlines are single bytes in UTF-8, so they are counted without decoding
+        for start in range(0, end, self.DECODING_CHUNK_SIZE):
+            chunk = bytes(self._mapping[start:min(end, start + self.DECODING_CHUNK_SIZE)])
+            count = chunk.count(b'\n')
+            if count:
+                lines += count
+                line_start = start + chunk.rfind(b'\n') + 1
+        return lines + 1, _count_characters(self._mapping, line_start, end) + 1
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice) or key.step not in (None, 1):
+            raise TypeError('MappedText supports only slices without step')
+        start, stop, _ = key.indices(len(self))
+        if stop <= start:
+            return ''
+
+        if stop - start > self.MAX_SLICE_LENGTH:
+            half = (self.MAX_SLICE_LENGTH - len(self.GAP)) // 2
+            return self[start:start + half] + self.GAP + self[stop - half:stop]
+        return str(self._mapping[self.byte_position(start):self.byte_position(stop)], 'utf-8')
+
+    def close(self):
+        """Close the mapping; the text can't be sliced afterwards."""
+        if hasattr(self._mapping, 'close'):
+            self._mapping.close()
+
+
+class FileUnbalanced(Unbalanced):
+    """The left-most unbalanced part of a file, obtained from Balance.check_file().
+
+    Positions and lengths are counted in characters as in Unbalanced; the summaries are decoded lazily from the
+    memory-mapped file, which stays open as long as the object exists.
+
+    Additional attributes:
+        opening_byte_length     The length of the opening element which was not closed in bytes.
+        opening_byte_position   The position of the opening element which was not closed in bytes.
+        closing_byte_length     The length of the closing element which was not opened in bytes.
+        closing_byte_position   The position of the closing element which was not opened in bytes.
+        text                    The text of the file as a MappedText object.
+
+    compact() and pickling give a plain Unbalanced object without byte positions, which doesn't keep the file open.
+    """
+
+    __slots__ = ()
+
+    @property
+    def text(self):
+        """Return the text of the file as a MappedText object."""
+        return self._string
+
+    def _byte_span(self, length, position):
+        if not length:
+            return 0, 0
+        start = self._string.byte_position(position)
+        return self._string.byte_position(position + length) - start, start
+
+    @property
+    def opening_byte_length(self):
+        """Return the length of the opening element which was not closed in bytes."""
+        return self._byte_span(self._opening_length, self._opening_position)[0]
+
+    @property
+    def opening_byte_position(self):
+        """Return the position of the opening element which was not closed in bytes."""
+        return self._byte_span(self._opening_length, self._opening_position)[1]
+
+    @property
+    def closing_byte_length(self):
+        """Return the length of the closing element which was not opened in bytes."""
+        return self._byte_span(self._closing_length, self._closing_position)[0]
+
+    @property
+    def closing_byte_position(self):
+        """Return the position of the closing element which was not opened in bytes."""
+        return self._byte_span(self._closing_length, self._closing_position)[1]
+
+
+class BytesUnbalanced(Unbalanced):
+    """The left-most unbalanced part of UTF-8 encoded text, obtained from Balance.is_unbalanced_bytes().
+
+    Positions and lengths are counted in bytes of the bytes-like object which was checked. decoded() returns the same
+    result counted in characters; the summaries are its ones, so the characters before the unmatched elements are
+    counted only when the summaries are requested.
+
+    compact() and pickling keep the compact form of decoded() instead of the bytes-like object.
+    """
+
+    __slots__ = ('_decoded',)
+
+    def __init__(self, data, opening_length, opening_position, closing_length=0, closing_position=0, decoded=None):
+        """Initialize BytesUnbalanced with the bytes-like object and byte positions and lengths as Unbalanced."""
+        super().__init__(data, opening_length, opening_position, closing_length, closing_position)
+        self._decoded = decoded
+
+    def decoded(self):
+        """Return the same result with positions and lengths in characters as a FileUnbalanced object."""
+        if self._decoded is None:
+            checkpoints = [(0, 0)]  # (character position, byte position) of the unmatched elements
+            spans = []
+            for length, position in ((self._opening_length, self._opening_position),
+                                     (self._closing_length, self._closing_position)):
+                if not length:
+                    spans.extend((0, 0))
+                    continue
+                characters, start = checkpoints[-1]
+                characters += _count_characters(self._string, start, position)
+                checkpoints.append((characters, position))
+                spans.extend((_count_characters(self._string, position, position + length), characters))
+            self._decoded = FileUnbalanced(MappedText(self._string, checkpoints), *spans)
+        return self._decoded
+
+    def _generate_short_summary(self):
+        self._short_summary = self.decoded().short_summary
+
+    def _generate_long_summary(self):
+        self._long_summary = self.decoded().long_summary
+
+    @property
+    def unclosed(self):
+        """Return the opening element which was not closed as a string or an empty string."""
+        return self.decoded().unclosed
+
+    def compact(self):
+        """Return the same result which keeps the compact form of decoded() instead of the bytes-like object."""
+        if self._string is None:
+            return self
+        return BytesUnbalanced(None, self._opening_length, self._opening_position, self._closing_length,
+                               self._closing_position, self.decoded().compact())
+
+    def __reduce__(self):
+        compact = self.compact()
+        return BytesUnbalanced, (None, self._opening_length, self._opening_position, self._closing_length,
+                                 self._closing_position, compact._decoded)
@@ -0,0 +1,136 @@
+"""Scan functions generated for the compiled parameters of a Balance, used by the 'generated' engine.
+
+The source of the function is written for one set of parameters: the group numbers of the pattern of 'regex', the
+openings expected by every closing and the lengths of the lines are inlined as literals, the branches of the kinds
+the parameters don't have (symmetrical elements, skip rules, tags) are left out, and the stack is kept in a local list
+and array with their bound methods. The source fully describes the function, so functions are cached by their source:
+Balance objects with the same parameters share one function, compiled once per process.
+
+The function scan(string, balance) returns None for a balanced string or the tuple (opening_length, opening_position,
+closing_length, closing_position) of the Unbalanced object; balance is only used to read tags and skipped regions.
+"""
+
+import re
+from array import array
+
+_cache = {}  # Source: scan function
+
+
+def scan_function(balance):
+    """Return the scan function for the compiled parameters of the Balance object."""
+    source = scan_source(balance)
+    function = _cache.get(source)
+    if function is None:
+        namespace = {'array': array, 're': re}
+        exec(compile(source, '<strbalance generated scan>', 'exec'), namespace)
+        function = _cache[source] = namespace['scan']
+    return function
+
+
+def scan_source(balance):
+    """Return the source of the scan function for the compiled parameters of the Balance object."""
+    kinds = balance.PUNCTUATION_KINDS
+    groups = {kind: group for group, kind in enumerate(balance._pattern_kinds) if kind is not None}
+    jumps = balance._tags or bool(balance._skip_starts)  # The search restarts after tags and skipped regions
+    # The length of a stacked line is known in advance if all of them have the same one
+    stacked_lengths = {len(line) for line in balance._openings + balance._symmetrical}
+    stacked_length = str(stacked_lengths.pop()) if len(stacked_lengths) == 1 and not balance._tags else \
+        'len(lines[-1])'
+    # A closing with one opening is compared with it, with several ones looked up in a set
+    single = all(len(openings) == 1 for openings in balance._closing_openings.values())
+    expected = ', '.join('{!r}: {}'.format(closing, repr(next(iter(openings))) if single else
+                                           'frozenset({!r})'.format(sorted(openings)))
+                         for closing, openings in sorted(balance._closing_openings.items()))
+
+    code = ['FINDITER = re.compile({!r}).finditer'.format(balance._pattern.pattern),
+            'EXPECTED = {' + expected + '}', '',
+            '',
+            'def scan(string, balance):',
+            '    lines = []',
+            "    positions = array('q')",
+            '    push_line = lines.append',
+            '    push_position = positions.append',
+            '    pop_line = lines.pop',
+            '    pop_position = positions.pop']
+    indent = '        '
+    if jumps:
+        code += ['    position = 0',
+                 '    while True:',
+                 '        for match in FINDITER(string, position):']
+        indent += '    '
+    else:
+        code += ['    for match in FINDITER(string):']
+    code.append(indent + 'group = match.lastindex')
+
+    branches = []
+    if kinds['closing'] in groups:
+        closing_lengths = {len(line) for line in balance._closings}
+        closing_length = str(closing_lengths.pop()) if len(closing_lengths) == 1 else 'len(line)'
+        branches.append((groups[kinds['closing']], [
+            'line = match.group()',
+            'if not lines:',
+            '    return 0, 0, {}, match.start()'.format(closing_length),
+            'if lines[-1] {} EXPECTED[line]:'.format('!=' if single else 'not in'),
+            '    return {}, positions[-1], {}, match.start()'.format(stacked_length, closing_length),
+            'pop_line()',
+            'pop_position()']))
+    if kinds['opening'] in groups:
+        branches.append((groups[kinds['opening']], [
+            'push_line(match.group())',
+            'push_position(match.start())']))
+    if kinds['symmetrical'] in groups:
+        branches.append((groups[kinds['symmetrical']], [
+            'line = match.group()',
+            'if lines and lines[-1] == line:',
+            '    pop_line()',
+            '    pop_position()',
+            'else:',
+            '    push_line(line)',
+            '    push_position(match.start())']))
+    if kinds['skip'] in groups:
+        branches.append((groups[kinds['skip']], [
+            'position = balance._skip_end(string, match.start(), match.group(), True)',
+            'break']))
+    if kinds['tag'] in groups:
+        tokens = balance.TAG_TOKENS
+        branches.append((groups[kinds['tag']], [
+            'start = match.start()',
+            'if match.group() == {!r}:'.format(balance.TAG_END),
+            '    if not lines:',
+            '        return 0, 0, 1, start',
+            '    return len(lines[-1]), positions[-1], 1, start',
+            'token, position, value = balance._read_tag(string, start)',
+            'if token == {}:'.format(tokens['opening']),
+            '    push_line(value)',
+            '    push_position(start)',
+            'elif token == {}:'.format(tokens['closing']),
+            '    if not lines:',
+            '        return 0, 0, position - start, start',
+            '    if lines[-1] != value:',
+            '        return len(lines[-1]), positions[-1], position - start, start',
+            '    pop_line()',
+            '    pop_position()',
+            'elif token == {}:'.format(tokens['incomplete']),
+            '    return value, start, 0, 0',
+            'break']))
+
+    for index, (group, lines) in enumerate(branches):
+        if index == 0:
+            code.append(indent + 'if group == {}:'.format(group))
+        elif index == len(branches) - 1:  # The only group left
+            code.append(indent + 'else:')
+        else:
+            code.append(indent + 'elif group == {}:'.format(group))
+        code += [indent + '    ' + line for line in lines]
+    if not branches:
+        code.append(indent + 'pass')
+
+    ending = ['if lines:',
+              '    return {}, positions[-1], 0, 0'.format(stacked_length),
+              'return None']
+    if jumps:
+        code.append('        else:')
+        code += ['            ' + line for line in ending]
+    else:
+        code += ['    ' + line for line in ending]
+    return '\n'.join(code) + '\n'
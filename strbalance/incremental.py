@@ -0,0 +1,139 @@
+import bisect
+from array import array
+
+from strbalance.scanner import Scanner
+from strbalance.unbalanced import Unbalanced
+
+
+class IncrementalScanner(Scanner):
+    """Scanner of a text which is edited between the checks, obtained from Balance.incremental().
+
+    While scanning, it saves a checkpoint (the position and a copy of the punctuation stack) about every
+    CHECKPOINT_INTERVAL characters. After an edit only the text from the last checkpoint before the edit is scanned
+    again, and the scan stops as soon as it reaches a checkpoint saved after the edit with the same stack: the rest of
+    the text is the same, so is the rest of the scan. An edit after the unbalanced element found before costs nothing.
+
+    Exports methods:
+        text                    The current text (property).
+        is_unbalanced()         Return None or an Unbalanced object for the current text.
+        apply_edit(start, end, new_text)
+                                Replace the text between the positions with new_text and return the new result.
+
+    Class constants:
+        CHECKPOINT_INTERVAL     Number of characters between the checkpoints.
+    """
+
+    __slots__ = ('_checkpoints', '_checkpoint_positions', '_outcome', '_reach', '_stale')
+
+    CHECKPOINT_INTERVAL = 4096
+
+    def __init__(self, balance, text=''):
+        """Initialize IncrementalScanner for the Balance object with the text and check it."""
+        if not isinstance(text, str):
+            raise TypeError("text must be string")
+        super().__init__(balance, text)
+        self._checkpoints = [(0, (), array('q'), b'')]  # (position, lines, positions, types)
+        self._checkpoint_positions = [0]
+        self._outcome = None  # Positions of the unbalanced element or None
+        self._reach = None  # The text before it determines the outcome; None if the outcome depends on the whole text
+
+        # Checkpoints beyond the unbalanced element, saved before an edit made it unbalanced, with the outcome of the
+        # scan they belong to: (position, lines, positions, types, (outcome, reach))
+        self._stale = []
+        self._rescan([])
+
+    @property
+    def text(self):
+        """Return the current text."""
+        return self._string
+
+    def is_unbalanced(self):
+        """Return None if the current text is balanced or an Unbalanced object otherwise."""
+        if self._outcome is None:
+            return None
+        return Unbalanced(self._string, *self._outcome)
+
+    def apply_edit(self, start, end, new_text):
+        """Replace the text between start and end with new_text, check it again and return None or an Unbalanced
+        object."""
+        if not isinstance(new_text, str):
+            raise TypeError("new_text must be string")
+        if not 0 <= start <= end <= len(self._string):
+            raise ValueError("edit must satisfy 0 <= start <= end <= len(text)")
+
+        self._string = self._string[:start] + new_text + self._string[end:]
+        delta = len(new_text) - (end - start)
+
+        def shift(position):
+            return position + delta if position >= end else position
+
+        def shift_outcome(outcome, reach):
+            if outcome is not None:
+                opening_length, opening_position, closing_length, closing_position = outcome
+                outcome = (opening_length, shift(opening_position) if opening_length else opening_position,
+                           closing_length, shift(closing_position) if closing_length else closing_position)
+            return outcome, None if reach is None else reach + delta
+
+        # Checkpoints after the edit may be reached again with the same stack; stale ones before it lose their outcome
+        stale = [(position + delta, lines, array('q', map(shift, positions)), types, result)
+                 for position, lines, positions, types, result in self._stale if position > end]
+        results = {id(result): shift_outcome(*result) for result in {id(item[4]): item[4] for item in stale}.values()}
+        self._stale = [item[:4] + (results[id(item[4])],) for item in stale]
+        if self._reach is not None and start >= self._reach:
+            return self.is_unbalanced()
+
+        index = max(1, bisect.bisect_right(self._checkpoint_positions, start - self._balance._lookahead))
+        result = shift_outcome(self._outcome, self._reach)
+        candidates = [(position + delta, lines, array('q', map(shift, positions)), types, result)
+                      for position, lines, positions, types in self._checkpoints[index:] if position > end]
+        del self._checkpoints[index:]
+        del self._checkpoint_positions[index:]
+        self._rescan(candidates + self._stale)
+        return self.is_unbalanced()
+
+    def _rescan(self, candidates):
+        # Scans from the last checkpoint; when a candidate checkpoint is reached with the same stack, the scan stops,
+        # and the candidates of the same scan with their outcome replace the rest of it
+        position, lines, positions, types = self._checkpoints[-1]
+        self._lines, self._positions, self._types = list(lines), array('q', positions), bytearray(types)
+        string = self._string
+        candidate = 0
+        while True:
+            stop = position + self.CHECKPOINT_INTERVAL
+            while candidate < len(candidates) and candidates[candidate][0] <= position:
+                candidate += 1
+            if candidate < len(candidates):
+                stop = min(stop, candidates[candidate][0])
+
+            unbalanced = self.scan(position, stop=stop)
+            if unbalanced is not None or self._position >= len(string):
+                break
+            position = self._position
+
+            if candidate < len(candidates) and candidates[candidate][0] == position and \
+                    candidates[candidate][1] == tuple(self._lines) and candidates[candidate][2] == self._positions \
+                    and candidates[candidate][3] == self._types:
+                result = candidates[candidate][4]
+                same = [item for item in candidates[candidate:] if item[4] is result]
+                self._checkpoints.extend(item[:4] for item in same)
+                self._checkpoint_positions.extend(item[0] for item in same)
+                self._stale = [item for item in candidates[candidate:] if item[4] is not result]
+                self._outcome, self._reach = result
+                return
+            self._checkpoints.append((position, tuple(self._lines), array('q', self._positions), bytes(self._types)))
+            self._checkpoint_positions.append(position)
+
+        if unbalanced is None:
+            self._outcome, self._reach = None, None
+            self._stale = []
+            return
+        self._outcome = (unbalanced.opening_length, unbalanced.opening_position,
+                         unbalanced.closing_length, unbalanced.closing_position)
+        if self._position >= len(string):  # Punctuation left open at the end
+            self._reach = None
+            self._stale = []
+        else:  # The element at self._position, with the longest sequence or the tag which could start there
+            self._reach = self._position + self._balance._lookahead + 1
+            if self._balance._tags and string[self._position] == self._balance.TAG_BEGIN:
+                self._reach = max(self._reach, self._balance._read_tag(string, self._position)[1] + 1)
+            self._stale = [item for item in candidates if item[0] > self._position]
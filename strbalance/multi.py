@@ -0,0 +1,164 @@
+"""Checking one text with several Balance objects in a single pass.
+
+The text is searched once for the characters any of the Balance objects can begin an element with (the union of their
+first characters). At every such position, every Balance whose previous element doesn't cover it looks up its own
+element there, so the elements (and the precedence among them) are those it finds on its own, and updates its own
+stack. A Balance drops out of the pass once its result is known.
+"""
+
+from array import array
+
+from strbalance.balance import Balance
+from strbalance.unbalanced import Unbalanced
+
+_LONGER = object()  # The character begins a longer element, which is looked up in the prefix tree
+
+
+class _State:
+    # The check of the text by one Balance object: its elements by the first character, its stack and the position
+    # before which the text is covered by its previous element
+    __slots__ = ('index', 'balance', 'elements', 'lines', 'positions', 'resume')
+
+    def __init__(self, index, balance, elements):
+        self.index = index
+        self.balance = balance
+        self.elements = elements
+        self.lines = []
+        self.positions = array('q')
+        self.resume = 0
+
+
+class MultiBalance:
+    """Balance checker for strings with several sets of balancing parameters at once.
+
+    Constructor takes a list of Balance objects. Method is_unbalanced() checks the string with all of them in one pass
+    and returns a list with the result of every Balance in the same order: None or an Unbalanced object, the same as
+    that of its own is_unbalanced(). The pass searches the string once for the first characters of the elements of all
+    the Balance objects and updates a stack per Balance, so checking with N of them costs about one scan instead of N.
+    Balance objects with limits are checked on their own, as is_unbalanced() does.
+    """
+
+    def __init__(self, balances):
+        """Initialize MultiBalance with a list of Balance objects."""
+        if not isinstance(balances, list):
+            raise TypeError("balances argument must be a list")
+
+        self._balances = balances
+        self._elements = [self._compile_elements(balance) for balance in balances]
+        characters = set()
+        for elements in self._elements:
+            characters.update(elements)
+        import re  # Imported by the first MultiBalance, not by the package
+        if characters:
+            self._pattern = re.compile('[' + ''.join(re.escape(char) for char in sorted(characters)) + ']')
+        else:
+            self._pattern = re.compile('(?!)')  # Never matches
+
+    @staticmethod
+    def _compile_elements(balance):
+        # {first character: (kind, line) of the only element beginning with it or _LONGER} from the prefix tree
+        return {char: _LONGER if len(node) > 1 else node[None]
+                for char, node in balance._trie.items() if char is not None}
+
+    @property
+    def balances(self):
+        """Return the list of Balance objects."""
+        return self._balances
+
+    def is_unbalanced(self, string):
+        """Check the string with every Balance object and return the list of their results (None or Unbalanced)."""
+        if not isinstance(string, str):
+            raise TypeError("first argument must be string")
+
+        results = [None] * len(self._balances)
+        states = []
+        for index, (balance, elements) in enumerate(zip(self._balances, self._elements)):
+            if balance._limited:
+                results[index] = balance.is_unbalanced(string)
+            else:
+                states.append(_State(index, balance, elements))
+
+        closing_kind = Balance.PUNCTUATION_KINDS['closing']
+        opening_kind = Balance.PUNCTUATION_KINDS['opening']
+        symmetrical_kind = Balance.PUNCTUATION_KINDS['symmetrical']
+        skip_kind = Balance.PUNCTUATION_KINDS['skip']
+        for match in self._pattern.finditer(string):
+            if not states:
+                break
+            position = match.start()
+            char = match.group()
+            finished = False
+            for state in states:
+                if position < state.resume:  # Inside the element or the region found before
+                    continue
+                element = state.elements.get(char)
+                if element is None:
+                    continue
+                if element is _LONGER:
+                    element = state.balance._trie_search(string, position, position + 1)
+                    if element is None:
+                        continue
+                    element = element[1:]
+                kind, line = element
+                lines = state.lines
+                if kind == closing_kind:
+                    if not lines:
+                        results[state.index] = Unbalanced(string, 0, 0, len(line), position)
+                    elif lines[-1] not in state.balance._closing_openings[line]:
+                        results[state.index] = Unbalanced(string, len(lines[-1]), state.positions[-1], len(line),
+                                                          position)
+                    else:
+                        lines.pop()
+                        state.positions.pop()
+                        state.resume = position + len(line)
+                        continue
+                    finished = True
+                elif kind == opening_kind or kind == symmetrical_kind and (not lines or lines[-1] != line):
+                    lines.append(line)
+                    state.positions.append(position)
+                    state.resume = position + len(line)
+                elif kind == symmetrical_kind:
+                    lines.pop()
+                    state.positions.pop()
+                    state.resume = position + len(line)
+                elif kind == skip_kind:
+                    state.resume = state.balance._skip_end(string, position, line, True)
+                else:
+                    result = self._tag(state, string, position)
+                    if result is not None:
+                        results[state.index] = result
+                        finished = True
+            if finished:
+                states = [state for state in states if results[state.index] is None]
+
+        for state in states:
+            if state.lines:
+                results[state.index] = Unbalanced(string, len(state.lines[-1]), state.positions[-1])
+        return results
+
+    @staticmethod
+    def _tag(state, string, position):
+        # Reads the tag beginning at the position as Scanner does and returns None or the Unbalanced object
+        balance = state.balance
+        lines = state.lines
+        if string[position] == balance.TAG_END:  # Not a part of any tag
+            if not lines:
+                return Unbalanced(string, 0, 0, 1, position)
+            return Unbalanced(string, len(lines[-1]), state.positions[-1], 1, position)
+
+        tokens = balance.TAG_TOKENS
+        token, end, value = balance._read_tag(string, position)
+        if token == tokens['opening']:
+            lines.append(value)
+            state.positions.append(position)
+        elif token == tokens['closing']:
+            if not lines:
+                return Unbalanced(string, 0, 0, end - position, position)
+            if lines[-1] != value:
+                return Unbalanced(string, len(lines[-1]), state.positions[-1], end - position, position)
+            lines.pop()
+            state.positions.pop()
+        elif token == tokens['incomplete']:
+            return Unbalanced(string, value, position)
+        state.resume = end
+        return None
@@ -0,0 +1,109 @@
+"""The table of all matched pairs of a string, found in one pass.
+
+Balance.find_pairs() scans the string with PairScanner, which keeps the id and the length of every stacked element and
+records each pair when its closing element pops it off the stack. The pairs are stored column by column in arrays of
+machine integers rather than as one Python object per pair, so a table of millions of pairs takes a few dozen bytes
+per pair.
+"""
+
+from array import array
+
+from strbalance.scanner import Scanner
+
+
+class PairTable:
+    """All pairs matched in a string, in the order of their closing elements.
+
+    Every column is an array('l') with an item per pair:
+        opening_positions   Position of the opening element (or the opening tag).
+        opening_lengths     Length of the opening element; for a tag, of the whole tag with its attributes.
+        closing_positions   Position of the closing element.
+        closing_lengths     Length of the closing element.
+        depths              Number of pairs the pair is nested in, 0 for the outermost ones.
+        ids                 Id of the opening element: its index in delimiters.
+
+    Other attributes:
+        delimiters          The opening elements by id: None for id 0, which is never used, the punctuation of the
+                            Balance object in sorted order, then the stack lines of the tags (such as '<p>') in the
+                            order they were first opened in the string.
+        unbalanced          None if the string is balanced or the Unbalanced object returned by is_unbalanced(); the
+                            table then holds the pairs closed before the element where the check stopped.
+    """
+
+    __slots__ = ('opening_positions', 'opening_lengths', 'closing_positions', 'closing_lengths', 'depths', 'ids',
+                 'delimiters', 'unbalanced')
+
+    def __init__(self, delimiters):
+        """Initialize PairTable with empty columns and the list of delimiters."""
+        self.opening_positions = array('l')
+        self.opening_lengths = array('l')
+        self.closing_positions = array('l')
+        self.closing_lengths = array('l')
+        self.depths = array('l')
+        self.ids = array('l')
+        self.delimiters = delimiters
+        self.unbalanced = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __repr__(self):
+        return 'PairTable(pairs={}, balanced={})'.format(len(self), self.unbalanced is None)
+
+
+class PairScanner(Scanner):
+    """Scanner which records every pair it matches in a PairTable (see Balance.find_pairs()).
+
+    Keeps the id and the length of every stacked element next to the stack and adds a row to the table whenever a
+    closing element pops one off it.
+    """
+
+    __slots__ = ('_table', '_tag_ids', '_ids', '_lengths')
+
+    def __init__(self, balance, string):
+        """Initialize PairScanner for the Balance object with the string to check."""
+        ids = balance._line_ids
+        self._table = PairTable([None] + sorted(ids, key=ids.get))
+        self._tag_ids = {}  # Ids of the stack lines of tags, added to the delimiters as they are opened
+        self._ids = array('l')
+        self._lengths = array('l')
+        super().__init__(balance, string)
+
+    def _push(self, line, position, punctuation_type):
+        super()._push(line, position, punctuation_type)
+        if punctuation_type == self._balance.PUNCTUATION_TYPES['opened-tag']:
+            line_id = self._tag_ids.get(line)
+            if line_id is None:
+                line_id = self._tag_ids[line] = len(self._table.delimiters)
+                self._table.delimiters.append(line)
+        else:
+            line_id = self._balance._line_ids[line]
+        self._ids.append(line_id)
+        self._lengths.append(len(line))
+
+    def _tags_iteration(self, position, final):
+        depth = len(self._lines)
+        finished, result = super()._tags_iteration(position, final)
+        if not finished and len(self._lines) > depth:  # The length of an opening tag includes its attributes
+            self._lengths[-1] = result - position
+        return finished, result
+
+    def _close(self, position, length):
+        table = self._table
+        table.opening_positions.append(self._positions[-1])
+        table.opening_lengths.append(self._lengths.pop())
+        table.closing_positions.append(position)
+        table.closing_lengths.append(length)
+        table.ids.append(self._ids.pop())
+        super()._close(position, length)
+        table.depths.append(len(self._lines))
+
+    def find_pairs(self):
+        """Scan the string and return its PairTable."""
+        self._table.unbalanced = self.scan()
+        return self._table
+
+
+def find_pairs(balance, string):
+    """Return the PairTable of the string checked with the Balance object (see help(Balance.find_pairs))."""
+    return PairScanner(balance, string).find_pairs()
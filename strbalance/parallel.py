@@ -0,0 +1,261 @@
+"""Checking one long string in parts, in parallel worker processes.
+
+The string is split into chunks at characters which can't be a part of any punctuation, so every chunk can be scanned
+on its own unless a tag crosses the border. A worker scans its chunk with a stack whose bottom is unknown and reduces it
+to a summary:
+    events      Everything the chunk does to the stack it starts with, in order: closing elements, closing tags and
+                TAG_END characters outside of tags.
+    error       Positions of an unbalanced element found in the chunk itself, if any.
+    frames      The punctuation left open by the chunk (lines, positions and types).
+    stop        The position of a symmetrical element met with nothing opened in the chunk, if any: whether it opens or
+                closes depends on the stack the chunk starts with, so the rest of the chunk is scanned once that stack
+                is known. Also the position of a tag which continues beyond the chunk: the scan from there goes on into
+                the next chunks, whose summaries are then dropped, until it reaches the end of a chunk outside a tag.
+Summaries of neighbouring chunks are merged in a tree by replaying the events of the right one on the frames of the left
+one. The merged summaries are then replayed from the beginning of the string on a real stack, which gives the same
+left-most unbalanced element as the sequential scan.
+"""
+
+import os
+import re
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from strbalance.scanner import Scanner
+from strbalance.unbalanced import Unbalanced
+
+CLOSE, CLOSE_TAG, TAG_END = range(3)  # Kinds of events
+
+_worker_balance = None
+
+
+class _Ambiguity(Exception):
+    def __init__(self, position):
+        super().__init__(position)
+        self.position = position
+
+
+class ReducingScanner(Scanner):
+    """Scanner of one chunk of a string which reduces it to a summary (see help(strbalance.parallel)).
+
+    Without the frames of the stack the chunk starts with, the bottom of the stack is an unknown element, and the
+    scan records the events which involve it instead of deciding on them.
+    """
+
+    __slots__ = ('_unknown_type', '_events', '_error', '_stop')
+
+    def __init__(self, balance, string, offset, lines=None, positions=None, types=None):
+        """Initialize ReducingScanner with the chunk (and one character before it) starting at the offset."""
+        super().__init__(balance, string)
+        self._offset = offset
+        self._unknown_type = max(balance.PUNCTUATION_TYPES.values()) + 1
+        if lines is None:
+            self._push('', offset, self._unknown_type)
+        else:
+            self._lines, self._positions, self._types = lines, positions, types
+        self._events = []
+        self._error = None
+        self._stop = None
+
+    def _bottom(self):
+        return self._types and self._types[-1] == self._unknown_type
+
+    def _push(self, line, position, punctuation_type):
+        if self._bottom() and line in self._balance._symmetrical:
+            raise _Ambiguity(position)
+        super()._push(line, position, punctuation_type)
+
+    def reduce(self, position):
+        """Scan the chunk from the position and return its summary."""
+        balance = self._balance
+        string = self._string
+        while True:
+            try:
+                unbalanced = self.scan(position)
+            except _Ambiguity as ambiguity:
+                self._stop = ambiguity.position
+                break
+            position = self._position
+            if position >= len(string):
+                break
+
+            if balance._tags and string[position] == balance.TAG_BEGIN:
+                token, end, line = balance._read_tag(string, position)
+                if _crosses(balance, string, position):
+                    self._stop = position + self._offset
+                elif self._bottom() and token == balance.TAG_TOKENS['closing']:
+                    self._events.append((CLOSE_TAG, position + self._offset, end - position, line))
+                    position = end
+                    continue
+                else:
+                    self._error = _positions(unbalanced)
+                break
+            if not self._bottom():
+                self._error = _positions(unbalanced)
+                break
+            if balance._tags and string[position] == balance.TAG_END:
+                self._events.append((TAG_END, position + self._offset))
+                position += 1
+            else:
+                self._events.append((CLOSE, string[position:position + unbalanced.closing_length],
+                                     position + self._offset))
+                position += unbalanced.closing_length
+
+        start = 1 if self._lines and self._types[0] == self._unknown_type else 0
+        return self._events, self._error, self._lines[start:], self._positions[start:], self._types[start:], \
+            self._stop
+
+
+def _positions(unbalanced):
+    return (unbalanced.opening_length, unbalanced.opening_position,
+            unbalanced.closing_length, unbalanced.closing_position)
+
+
+def _crosses(balance, string, position):
+    # Whether the tag at the position may continue beyond the end of the string
+    token, end, _ = balance._read_tag(string, position)
+    return token == balance.TAG_TOKENS['incomplete'] and end >= len(string)
+
+
+def _apply(balance, event, lines, positions, types):
+    # Applies the event to the stack and returns the positions of the unbalanced element or None
+    kind = event[0]
+    if kind == CLOSE:
+        line, position = event[1:]
+        if not lines:
+            return 0, 0, len(line), position
+        if lines[-1] not in balance._closing_openings[line]:
+            return len(lines[-1]), positions[-1], len(line), position
+    elif kind == CLOSE_TAG:
+        position, length, line = event[1:]
+        if not lines:
+            return 0, 0, length, position
+        if types[-1] != balance.PUNCTUATION_TYPES['opened-tag'] or lines[-1] != line:
+            return len(lines[-1]), positions[-1], length, position
+    else:  # TAG_END closes nothing
+        if not lines:
+            return 0, 0, 1, event[1]
+        return len(lines[-1]), positions[-1], 1, event[1]
+
+    lines.pop()
+    positions.pop()
+    types.pop()
+    return None
+
+
+def _merge(balance, left, right):
+    # Summary of two neighbouring chunks; the left one must have no stop
+    events, error, lines, positions, types, _ = left
+    if error is not None:
+        return left
+    events, lines, positions, types = list(events), list(lines), array('q', positions), bytearray(types)
+    right_events, error, right_lines, right_positions, right_types, stop = right
+    for index, event in enumerate(right_events):
+        if not lines:
+            events.extend(right_events[index:])
+            break
+        unbalanced = _apply(balance, event, lines, positions, types)
+        if unbalanced is not None:
+            return events, unbalanced, lines, positions, types, None
+    return events, error, lines + right_lines, positions + right_positions, types + right_types, stop
+
+
+def _initialize_worker(balance):
+    global _worker_balance
+    _worker_balance = balance
+
+
+def _reduce_chunk(chunk):
+    offset, string, start = chunk
+    return ReducingScanner(_worker_balance, string, offset).reduce(start)
+
+
+def _bounds(balance, string, chunk_size):
+    # Chunks end right after a character which is a part of no punctuation and no tag
+    characters = set(''.join(balance._lines))
+    if balance._tags:
+        characters.update(balance.TAG_BEGIN + balance.TAG_END)
+    if characters:
+        neutral = re.compile('[^' + ''.join(re.escape(character) for character in sorted(characters)) + ']')
+    else:
+        neutral = re.compile('.', re.DOTALL)
+
+    bounds = [0]
+    while bounds[-1] + chunk_size < len(string):
+        match = neutral.search(string, bounds[-1] + chunk_size)
+        if match is None:
+            break
+        bounds.append(match.end())
+    if bounds[-1] < len(string):
+        bounds.append(len(string))
+    return bounds
+
+
+def _chunks(string, bounds):
+    # (offset, chunk with one character before it, position of the chunk in it)
+    for start, end in zip(bounds, bounds[1:]):
+        before = 1 if start else 0
+        yield start - before, string[start - before:end], before
+
+
+def is_unbalanced(balance, string, workers, chunk_size):
+    """Check the string in chunks of about chunk_size characters and return None or an Unbalanced object."""
+    bounds = _bounds(balance, string, chunk_size)
+    chunks = list(_chunks(string, bounds))
+    if workers == 0:
+        _initialize_worker(balance)
+        summaries = [_reduce_chunk(chunk) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(workers or os.cpu_count() or 1, initializer=_initialize_worker,
+                                 initargs=(balance,)) as executor:
+            summaries = list(executor.map(_reduce_chunk, chunks))
+    ends = bounds[1:]
+
+    # Merging in a tree: neighbours are merged level by level unless the left one has a stop
+    while len(summaries) > 1:
+        merged, merged_ends = [], []
+        index = 0
+        while index < len(summaries):
+            if index + 1 < len(summaries) and summaries[index][5] is None:
+                merged.append(_merge(balance, summaries[index], summaries[index + 1]))
+                merged_ends.append(ends[index + 1])
+                index += 2
+            else:
+                merged.append(summaries[index])
+                merged_ends.append(ends[index])
+                index += 1
+        if len(merged) == len(summaries):
+            break
+        summaries, ends = merged, merged_ends
+
+    # Replaying the summaries on the real stack
+    lines, positions, types = [], array('q'), bytearray()
+    index = 0
+    while index < len(summaries):
+        events, error, chunk_lines, chunk_positions, chunk_types, stop = summaries[index]
+        for event in events:
+            unbalanced = _apply(balance, event, lines, positions, types)
+            if unbalanced is not None:
+                return Unbalanced(string, *unbalanced)
+        if error is not None:
+            return Unbalanced(string, *error)
+        lines.extend(chunk_lines)
+        positions.extend(chunk_positions)
+        types.extend(chunk_types)
+
+        while stop is not None:  # The rest of the chunk is scanned on the real stack
+            offset, chunk, start = next(_chunks(string, [stop, ends[index]]))
+            scanner = ReducingScanner(balance, chunk, offset, lines, positions, types)
+            unbalanced = scanner.scan(start)
+            if scanner._position >= len(chunk):
+                stop = None
+            elif ends[index] < len(string) and _crosses(balance, chunk, scanner._position):
+                stop = scanner._position + offset  # The scan goes on into the next chunk instead of its summary
+                index += 1
+            else:
+                return Unbalanced(string, *_positions(unbalanced))
+        index += 1
+
+    if lines:
+        return Unbalanced(string, len(lines[-1]), positions[-1])
+    return None
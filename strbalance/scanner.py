@@ -0,0 +1,483 @@
+import time
+from array import array
+
+from strbalance.unbalanced import SparseString, Unbalanced
+
+
+class LimitExceeded(Exception):
+    """Raised when a check exceeds a limit of the Balance object (see help(Balance)).
+
+    Attributes:
+        limit                   The name of the limit: 'max_depth', 'max_input_length' or 'timeout'.
+        position                The position the scan got to; the text before it was checked.
+        depth                   The depth of the punctuation stack at that position.
+    """
+
+    def __init__(self, limit, position, depth):
+        """Initialize LimitExceeded with the name of the limit, the position and the depth of the stack."""
+        super().__init__(limit, position, depth)
+        self.limit = limit
+        self.position = position
+        self.depth = depth
+
+    def __str__(self):
+        return '{} exceeded at position {} with depth {}'.format(self.limit, self.position, self.depth)
+
+
+class Scanner:
+    """The state of one check of a text by a Balance object.
+
+    Balance objects hold only the compiled balancing parameters and never change after construction, while
+    everything which changes during a check lives in a Scanner: the text, the punctuation stack and, for texts split
+    into chunks, the streaming state. A Balance can therefore be shared between threads, with a Scanner per check.
+
+    Scanner objects for whole strings are created by Balance.is_unbalanced(). Balance.stream() returns a new Scanner
+    for a text split into chunks, which exports methods:
+        feed(chunk)             Check the next chunk; returns an Unbalanced object as soon as the text is found out to
+                                be unbalanced, None otherwise.
+        finish()                Return None or an Unbalanced object for the whole text and start a new text.
+        is_unbalanced_chunks()  Feed all chunks of an iterable and finish.
+    """
+
+    __slots__ = ('_balance', '_string', '_offset', '_lines', '_positions', '_types',
+                 '_contexts', '_position', '_pending', '_result', '_final', '_partial')
+
+    LIMIT_CHECK_INTERVAL = 4096  # Maximum number of characters searched between the checks of the time limit
+
+    def __init__(self, balance, string='', streaming=False):
+        """Initialize Scanner for the Balance object with the string to check or for a text split into chunks."""
+        self._balance = balance
+        self._reset(string, streaming)
+
+    def _reset(self, string, streaming):
+        self._string = string
+        self._offset = 0  # Position of the first character of self._string in the whole text
+
+        # The punctuation stack is kept as parallel arrays: lines, their positions and types
+        self._lines = []
+        self._positions = array('q')
+        self._types = bytearray()
+
+        # Streaming state, see feed() and finish()
+        self._contexts = {} if streaming else None  # Summary context of stacked punctuation no longer in the string
+        self._position = 0
+        self._pending = None
+        self._result = None
+        self._final = False
+        # The tag which continues beyond the string, see _partial_tag(): [form, position, value, length, resume, quote]
+        self._partial = None
+
+    def _pop(self):
+        self._lines.pop()
+        self._positions.pop()
+        self._types.pop()
+
+    def _push(self, line, position, punctuation_type):
+        self._lines.append(line)
+        self._positions.append(position)
+        self._types.append(punctuation_type)
+
+    def _close(self, position, length):
+        # Pops the punctuation closed by the element at the position (in the whole text) of the length
+        self._pop()
+
+    def _unbalanced(self, opening_length, opening_position, closing_length=0, closing_position=0):
+        # Positions are counted from the beginning of the whole text
+        if self._contexts is None:
+            return Unbalanced(self._string, opening_length, opening_position, closing_length, closing_position)
+        return Unbalanced(self._stream_source(), opening_length, opening_position, closing_length, closing_position)
+
+    def _unclosed(self, closing_length=0, closing_position=0):
+        if closing_length:
+            closing_position += self._offset
+        return self._unbalanced(len(self._lines[-1]), self._positions[-1], closing_length, closing_position)
+
+    def _search_function(self):
+        # Returns the function which finds the next punctuation: search(string, position, limit) returns
+        # (position, kind, line) or None
+        balance = self._balance
+        search = balance._regex_search if balance._engine == 'regex' else balance._trie_search
+        if balance._limited:
+            return self._limited_search(search)
+        return search
+
+    def _limited_search(self, search):
+        # Wraps the search with the checks of the limits of the Balance object: the length of the text before the
+        # scan, the depth of the stack before every search and the time every LIMIT_CHECK_INTERVAL characters
+        balance = self._balance
+        interval = self.LIMIT_CHECK_INTERVAL
+        deadline = None if balance._timeout is None else time.monotonic() + balance._timeout
+        if balance._max_input_length is not None and self._offset + len(self._string) > balance._max_input_length:
+            raise LimitExceeded('max_input_length', self._offset + self._position, len(self._lines))
+
+        def limited_search(string, position, limit):
+            while True:
+                if balance._max_depth is not None and len(self._lines) > balance._max_depth:
+                    raise LimitExceeded('max_depth', self._offset + position, len(self._lines))
+                if deadline is not None and time.monotonic() > deadline:
+                    raise LimitExceeded('timeout', self._offset + position, len(self._lines))
+                block_limit = min(limit, position + interval)
+                match = search(string, position, block_limit)
+                if match is not None or block_limit >= limit:
+                    return match
+                position = block_limit
+
+        return limited_search
+
+    def _tags_iteration(self, position, final):
+        # Returns (True, result) if the scan stops at the tag, (False, position after the tag) otherwise
+        balance = self._balance
+        string = self._string
+        if string[position:position + 1] == balance.TAG_END:  # Not a part of any tag
+            if not self._lines:
+                return True, self._unbalanced(0, 0, 1, position + self._offset)
+            return True, self._unclosed(1, position)
+
+        tokens = balance.TAG_TOKENS
+        token, end, value = balance._read_tag(string, position)
+        if token == tokens['opening']:
+            self._push(value, position + self._offset, balance.PUNCTUATION_TYPES['opened-tag'])
+        elif token == tokens['closing']:
+            if not self._lines:
+                return True, self._unbalanced(0, 0, end - position, position + self._offset)
+            if self._types[-1] != balance.PUNCTUATION_TYPES['opened-tag'] or self._lines[-1] != value:
+                return True, self._unclosed(end - position, position)
+            self._close(position + self._offset, end - position)
+        elif token == tokens['incomplete']:
+            if not final and end >= len(string):  # The tag may continue in the next chunk
+                if self._contexts is not None:
+                    self._partial = self._partial_tag(position)
+                    if self._partial is not None:
+                        self._position = self._partial[4] - self._offset
+                return True, None
+            return True, self._unbalanced(value, position + self._offset)
+        return False, end
+
+    def _partial_tag(self, position):
+        # The state of the tag at the position which continues beyond the streamed string, so that the next chunks go
+        # on reading it from where the string ends instead of from its beginning, or None if its form isn't known yet.
+        # The state is [form, position, value, length, resume, quote] with positions in the whole text: form is
+        # 'special' (value is the ending), 'opening' (value is the name) or 'closing' (value is the stack line), length
+        # is the length of its unclosed beginning, resume is where the reading goes on, quote is the quotation mark of
+        # an unfinished attribute value. Skipped regions which continue beyond the string are kept in the same form
+        # 'skip' with the end of the region as the value (see scan()).
+        balance = self._balance
+        string = self._string
+        offset = self._offset
+        length = len(string)
+        if string.startswith(balance.TAG_BEGIN + balance.TAG_CLOSE, position):
+            match = balance.CLOSING_TAG_PATTERN.match(string, position)
+            if match is None or match.end(1) == length:  # The name may go on
+                return None
+            return ['closing', position + offset, balance._tag_line(match.group(1)), 0, match.end() + offset, None]
+        if length - position < max(len(beginning) for beginning, _ in balance.SPECIAL_TAGS):  # Not known yet
+            return None
+        for beginning, ending in balance.SPECIAL_TAGS:
+            if string.startswith(beginning, position):
+                return ['special', position + offset, ending, len(beginning), position + len(beginning) + offset, None]
+        match = balance.OPENING_TAG_PATTERN.match(string, position)
+        if match is None or match.end(1) == length:
+            return None
+        end = match.end()
+        quote = string[end] if end < length else None  # The value of an attribute goes on
+        return ['opening', position + offset, match.group(1), match.end(1) - position,
+                end + offset + (quote is not None), quote]
+
+    def _continue_partial(self, final):
+        # Goes on reading the partial tag or skipped region in the string; returns the same as _tags_iteration()
+        balance = self._balance
+        string = self._string
+        offset = self._offset
+        form, start, value, length, resume, quote = self._partial
+        index = resume - offset
+        end = None
+        if form == 'special' or form == 'skip':
+            found = string.find(value, index)
+            if found >= 0:
+                self._partial = None
+                return False, found + len(value)
+            if final and form == 'skip':  # The region runs to the end of the text
+                self._partial = None
+                return False, len(string)
+            index = max(index, len(string) - len(value) + 1)
+        elif form == 'closing':
+            while index < len(string) and string[index] in balance.TAG_WHITESPACE:
+                index += 1
+            if index < len(string):
+                self._partial = None
+                if string[index] != balance.TAG_END:
+                    return True, self._unbalanced(1, start)
+                if not self._lines:
+                    return True, self._unbalanced(0, 0, index + 1 + offset - start, start)
+                if self._types[-1] != balance.PUNCTUATION_TYPES['opened-tag'] or self._lines[-1] != value:
+                    return True, self._unbalanced(len(self._lines[-1]), self._positions[-1],
+                                                  index + 1 + offset - start, start)
+                self._close(start, index + 1 + offset - start)
+                return False, index + 1
+            length = offset + index - start  # The incomplete tag runs to the end of the text
+        else:
+            while end is None:
+                if quote is not None:
+                    found = string.find(quote, index)
+                    if found < 0:
+                        index = len(string)
+                        break
+                    quote = None
+                    index = found + 1
+                    continue
+                match = balance.TAG_STOP_PATTERN.search(string, index)
+                if match is None:
+                    index = len(string)
+                    break
+                if match.group() == balance.TAG_BEGIN:
+                    self._partial = None
+                    return True, self._unbalanced(length, start)
+                if match.group() == balance.TAG_END:
+                    end = match.end()
+                else:
+                    quote = match.group()
+                    index = match.end()
+            if end is not None:
+                self._partial = None
+                if string[end - 2:end - 1] != balance.TAG_CLOSE and value.lower() not in balance._unpaired_tags:
+                    self._push(balance._tag_line(value), start, balance.PUNCTUATION_TYPES['opened-tag'])
+                return False, end
+
+        if final:
+            self._partial = None
+            return True, self._unbalanced(length, start)
+        self._partial[4:] = [index + offset, quote]
+        self._position = index
+        return True, None
+
+    def scan(self, position=0, final=True, stop=None):
+        """Scan the string from the position and return None or an Unbalanced object.
+
+        Unless the scan is final, stops before the punctuation (or the tag) which may continue beyond the end of the
+        string, saves the position to resume from and returns None. With stop, does the same before the first element
+        at or after that position. When the result is an Unbalanced object, the saved position is the one of the
+        element where the scan stopped (or the end of the string).
+        """
+        balance = self._balance
+        string = self._string
+        offset = self._offset
+        lines = self._lines
+        closing_openings = balance._closing_openings
+        closing_kind = balance.PUNCTUATION_KINDS['closing']
+        symmetrical_kind = balance.PUNCTUATION_KINDS['symmetrical']
+        tag_kind = balance.PUNCTUATION_KINDS['tag']
+        skip_kind = balance.PUNCTUATION_KINDS['skip']
+        non_tag = balance.PUNCTUATION_TYPES['non-tag']
+        search = self._search_function()
+        limit = len(string) if final else max(0, len(string) - balance._max_length + 1)
+        if stop is None:
+            stop = len(string)
+        if self._partial is not None:  # A tag which began in an earlier chunk
+            finished, result = self._continue_partial(final)
+            if finished:
+                return result
+            position = result
+
+        while True:
+            match = search(string, position, limit)
+            if match is None:  # No punctuation till the limit
+                if not final:
+                    self._position = max(position, limit)
+                    return None
+                self._position = len(string)
+                return self._unclosed() if lines else None
+            position, kind, line = match
+            if position >= stop:
+                self._position = position
+                return None
+
+            if kind == closing_kind:
+                self._position = position
+                if not lines:
+                    return self._unbalanced(0, 0, len(line), position + offset)  # empty stack
+                if lines[-1] not in closing_openings[line]:
+                    return self._unclosed(len(line), position)
+                self._close(position + offset, len(line))
+            elif kind == tag_kind:
+                self._position = position
+                finished, result = self._tags_iteration(position, final)
+                if finished:
+                    return result
+                position = result
+                continue
+            elif kind == symmetrical_kind and lines and lines[-1] == line:
+                self._close(position + offset, len(line))
+            elif kind == skip_kind:
+                end = balance._skip_end(string, position, line, final)
+                if end is None:  # The region may end in the next chunk
+                    self._position = position
+                    skip_end = balance._skip_ends[line]
+                    if self._contexts is not None and isinstance(skip_end, str):  # Searched on from the string end
+                        self._position = max(position + len(line), len(string) - len(skip_end) + 1)
+                        self._partial = ['skip', position + offset, skip_end, len(line), self._position + offset, None]
+                    return None
+                position = end
+                continue
+            else:
+                self._push(line, position + offset, non_tag)
+            position += len(line)
+
+    def feed(self, chunk):
+        """Check the next chunk of a text split into pieces of arbitrary size.
+
+        Return the Unbalanced object as soon as the text checked so far is found out to be unbalanced, None otherwise.
+        Positions in the result are counted from the beginning of the whole text. Only the unchecked tail of the text
+        and short context around the stacked punctuation are kept between the calls.
+        Call finish() after the last chunk to get the final result and to start a new text.
+        """
+        if not isinstance(chunk, str):
+            raise TypeError("chunk must be string")
+
+        if self._result is not None:
+            return self._result
+
+        self._string += chunk
+        if self._pending is None:
+            unbalanced = self.scan(self._position, final=False)
+            if unbalanced is None:
+                self._trim_stream()
+                return None
+            self._pending = (unbalanced.opening_length, unbalanced.opening_position,
+                             unbalanced.closing_length, unbalanced.closing_position)
+
+        # The summary of the result needs some text after the unmatched elements
+        opening_length, opening_position, closing_length, closing_position = self._pending
+        summary_end = max(opening_position + opening_length, closing_position + closing_length) + \
+            Unbalanced.SUMMARY_MAX_TAIL_LENGTH + 1
+        if self._offset + len(self._string) >= summary_end:
+            self._result = self._unbalanced(*self._pending)
+        return self._result
+
+    def finish(self):
+        """Finish the text passed to feed() and return None if it is balanced or an Unbalanced object otherwise."""
+        self._final = True
+        if self._result is None:
+            if self._pending is None:
+                self._result = self.scan(self._position, final=True)
+            else:
+                self._result = self._unbalanced(*self._pending)
+
+        result = self._result
+        self._reset('', streaming=True)
+        return result
+
+    def is_unbalanced_chunks(self, chunks):
+        """Check the text given as an iterable of strings (e.g. a text file) chunk by chunk with feed()."""
+        for chunk in chunks:
+            if self.feed(chunk) is not None:
+                break
+        return self.finish()
+
+    def _trim_stream(self):
+        # Drops the checked part of self._string except for one character needed to recognize self-closing tags and
+        # the context for summaries. The context of stacked punctuation is saved before it is dropped.
+        tail = Unbalanced.SUMMARY_MAX_TAIL_LENGTH
+        cut = max(0, self._position - tail)
+        length = len(self._string)
+
+        for index in range(len(self._lines) - 1, -1, -1):
+            position = self._positions[index] - self._offset
+            if position < 0:  # Older punctuation has been saved already
+                break
+            start = max(0, position - tail)
+            end = position + len(self._lines[index]) + tail + 1
+            if start < cut:
+                if end <= length:
+                    self._contexts[self._positions[index]] = (start + self._offset, self._string[start:end])
+                else:
+                    cut = start
+
+        partial = self._partial
+        if partial is not None and partial[0] != 'skip' and partial[1] - self._offset >= 0:  # The partial tag
+            position = partial[1] - self._offset
+            start = max(0, position - tail)
+            # The unclosed part of a closing tag runs to the end of the string, so it is kept whole
+            end = (length if partial[0] == 'closing' else position + partial[3]) + tail + 1
+            if start < cut:
+                if end <= length:
+                    self._contexts[partial[1]] = (start + self._offset, self._string[start:end])
+                else:
+                    cut = start
+
+        if len(self._contexts) > 2 * len(self._lines) + 16:  # Forget the context of closed punctuation
+            kept = list(self._positions) + ([partial[1]] if partial is not None else [])
+            self._contexts = {position: self._contexts[position] for position in kept if position in self._contexts}
+
+        self._string = self._string[cut:]
+        self._offset += cut
+        self._position -= cut
+
+    def _stream_source(self):
+        # The known length is exceeded by one until the whole text is known
+        length = self._offset + len(self._string) + (0 if self._final else 1)
+        return SparseString(length, list(self._contexts.values()) + [(self._offset, self._string)])
+
+
+class RecoveringScanner(Scanner):
+    """Scanner which goes on after every unbalanced element and reports all of them (see find_all()).
+
+    Keeps the number of every kind of stacked punctuation, so that finding out whether an unmatched closing element
+    has a matching opening one deeper in the stack costs as little as the check of the top.
+    """
+
+    __slots__ = ('_counts',)
+
+    def __init__(self, balance, string):
+        """Initialize RecoveringScanner for the Balance object with the string to check."""
+        super().__init__(balance, string)
+        self._counts = {}
+
+    def _push(self, line, position, punctuation_type):
+        super()._push(line, position, punctuation_type)
+        key = (punctuation_type, line)
+        self._counts[key] = self._counts.get(key, 0) + 1
+
+    def _pop(self):
+        self._counts[(self._types[-1], self._lines[-1])] -= 1
+        super()._pop()
+
+    def _matching_keys(self, position, length):
+        # Keys, i.e. (type, line), of the stacked punctuation which the closing element at the position would close
+        balance = self._balance
+        element = self._string[position:position + length]
+        if balance._tags and element == balance.TAG_END:  # Closes nothing
+            return []
+        if balance._tags and element.startswith(balance.TAG_BEGIN):
+            return [(balance.PUNCTUATION_TYPES['opened-tag'], balance._read_tag(self._string, position)[2])]
+        return [(balance.PUNCTUATION_TYPES['non-tag'], opening) for opening in balance._closing_openings[element]]
+
+    def find_all(self):
+        """Yield an Unbalanced object for every unbalanced element of the string (see Balance.find_all())."""
+        position = 0
+        while True:
+            unbalanced = self.scan(position)
+            if unbalanced is None:
+                return
+            yield unbalanced
+            position = self._position
+
+            if position >= len(self._string):  # The rest of the stack was not closed
+                self._pop()
+                while self._lines:
+                    yield self._unclosed()
+                    self._pop()
+                return
+
+            if unbalanced.closing_length and not unbalanced.opening_length:  # Nothing to close, skip
+                position += unbalanced.closing_length
+            elif unbalanced.closing_length:  # Mismatch with the top of the stack
+                keys = self._matching_keys(position, unbalanced.closing_length)
+                if any(self._counts.get(key) for key in keys):  # Close everything up to the match
+                    self._pop()
+                    while (self._types[-1], self._lines[-1]) not in keys:
+                        yield self._unclosed()
+                        self._pop()
+                else:
+                    position += unbalanced.closing_length
+            else:  # Incomplete tag, skip its first character
+                position += 1
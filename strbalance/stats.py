@@ -0,0 +1,113 @@
+"""Opt-in instrumentation of scans.
+
+Balance.is_unbalanced() scans with an InstrumentedScanner only when it is given a ScanStats object, so the ordinary
+scan has no counters at all.
+"""
+
+import time
+
+from strbalance.scanner import Scanner
+
+
+class ScanStats:
+    """Counters of the scans made with it, filled in by Balance.is_unbalanced(string, stats=...).
+
+    The counters add up over all the scans, so one object can collect the statistics of a sample of checks.
+
+    Attributes:
+        scans           Number of scans.
+        characters      Number of characters scanned: up to the unbalanced element or to the end of the string.
+        matches         Number of punctuation matches by kind, a dict with the keys of Balance.PUNCTUATION_KINDS.
+        lookups         Number of trie lookups of a character (the 'trie' and 'numpy' engines) or of pattern
+                        searches (the 'regex' engine).
+        max_depth       Maximum depth of the punctuation stack.
+        time            Wall time of the scans in seconds.
+        callback        None or a function called with the ScanStats object after every scan.
+    """
+
+    __slots__ = ('scans', 'characters', 'matches', 'lookups', 'max_depth', 'time', 'callback')
+
+    def __init__(self, callback=None):
+        """Initialize ScanStats with zero counters and the optional callback."""
+        self.scans = 0
+        self.characters = 0
+        self.matches = {'tag': 0, 'opening': 0, 'symmetrical': 0, 'closing': 0, 'skip': 0}
+        self.lookups = 0
+        self.max_depth = 0
+        self.time = 0.0
+        self.callback = callback
+
+    def __repr__(self):
+        return 'ScanStats(scans={}, characters={}, matches={}, lookups={}, max_depth={}, time={:.6f})'.format(
+            self.scans, self.characters, self.matches, self.lookups, self.max_depth, self.time)
+
+
+class InstrumentedScanner(Scanner):
+    """Scanner of a whole string which counts its work in a ScanStats object."""
+
+    __slots__ = ('_stats',)
+
+    def __init__(self, balance, string, stats):
+        """Initialize InstrumentedScanner for the Balance object with the string to check and the ScanStats."""
+        super().__init__(balance, string)
+        self._stats = stats
+
+    def _push(self, line, position, punctuation_type):
+        super()._push(line, position, punctuation_type)
+        if len(self._lines) > self._stats.max_depth:
+            self._stats.max_depth = len(self._lines)
+
+    def _search_function(self):
+        balance = self._balance
+        stats = self._stats
+        matches = stats.matches
+        kinds = {kind: name for name, kind in balance.PUNCTUATION_KINDS.items()}
+
+        def regex_search(string, position, limit):
+            stats.lookups += 1
+            match = balance._regex_search(string, position, limit)
+            if match is not None:
+                matches[kinds[match[1]]] += 1
+            return match
+
+        def trie_search(string, position, limit):
+            # The same walk as Balance._trie_search()
+            trie = balance._trie
+            length = len(string)
+            while position < limit:
+                stats.lookups += 1
+                node = trie.get(string[position])
+                if node is not None:
+                    best = node[None]
+                    end = min(length, position + balance._max_length)
+                    index = position + 1
+                    while index < end:
+                        stats.lookups += 1
+                        node = node.get(string[index])
+                        if node is None:
+                            break
+                        best = node[None]
+                        index += 1
+                    if best is not None:
+                        matches[kinds[best[0]]] += 1
+                        return position, best[0], best[1]
+                position += 1
+            return None
+
+        search = regex_search if balance._engine == 'regex' else trie_search
+        if balance._limited:
+            return self._limited_search(search)
+        return search
+
+    def scan(self, position=0, final=True, stop=None):
+        """Scan the string from the position as Scanner.scan() does and add the work to the ScanStats."""
+        stats = self._stats
+        start = time.perf_counter()
+        try:
+            return super().scan(position, final, stop)
+        finally:
+            stats.time += time.perf_counter() - start
+            stats.scans += 1
+            stats.characters += self._position - position
+            if stats.callback is not None:
+                stats.callback(stats)
@@ -8,14 +8,114 @@ The module exports:
                             (see help(Balance) for more details).
     function is_unbalanced  Creates Balance object and passes string to its is_unbalanced() method. Takes as parameters
                             the string to check and the parameters for Balance constructor.
+    function is_balanced    Creates Balance object and passes string to its is_balanced() method. Takes the same
+                            parameters as is_unbalanced().
+    function is_unbalanced_bytes
+                            Creates Balance object and passes UTF-8 encoded bytes to its is_unbalanced_bytes() method.
+                            Takes as parameters the bytes-like object to check and the parameters for Balance
+                            constructor.
+    function check_file     Creates Balance object and passes the path to its check_file() method. Takes as parameters
+                            the path of a UTF-8 text file and the parameters for Balance constructor.
+    function cache_info     Returns hits, misses, maximum and current size of the cache of Balance objects used by the
+                            functions above.
+    function cache_clear    Clears the cache of Balance objects and its statistics.
+    function set_cache_size Clears the cache of Balance objects and changes its maximum size.
+
+Balance objects are compiled once for every combination of parameters and kept in a least recently used cache of
+CACHE_SIZE entries, so the functions above cost only the check itself when called with the same parameters again.
 """
 
+import functools
+
 from strbalance.balance import Balance
 __version__ = '0.3.1'
+CACHE_SIZE = 128
+
+
+def _create_balance(pairs, symmetrical, tags, ignore_case, cjk, straight, custom, german, math, engine, max_depth,
+                    max_input_length, timeout, skip):
+    if pairs is not None:
+        pairs = [list(pair) for pair in pairs]
+    if symmetrical is not None:
+        symmetrical = list(symmetrical)
+    if skip is not None:
+        skip = [list(rule) for rule in skip]
+    return Balance(pairs, symmetrical, tags, ignore_case, cjk, straight, custom, german, math, engine, max_depth,
+                   max_input_length, timeout, skip)
+
+
+_cached_balance = functools.lru_cache(maxsize=CACHE_SIZE)(_create_balance)
+
+
+def _balance(pairs, symmetrical, tags, ignore_case, cjk, straight, custom, german, math, engine, max_depth,
+             max_input_length, timeout, skip):
+    # pairs, symmetrical and skip are converted to tuples to serve as a part of the cache key; anything else goes to
+    # Balance constructor as it is, to be rejected there. So do bool limits, which are equal to 0 and 1 as keys
+    if (pairs is None or isinstance(pairs, list)) and (symmetrical is None or isinstance(symmetrical, list)) and \
+            (skip is None or isinstance(skip, list)) and \
+            not any(isinstance(limit, bool) for limit in (max_depth, max_input_length, timeout)):
+        try:
+            key = (None if pairs is None else tuple(tuple(pair) for pair in pairs),
+                   None if symmetrical is None else tuple(symmetrical),
+                   bool(tags), bool(ignore_case), bool(cjk), bool(straight), bool(custom), bool(german), bool(math),
+                   engine, max_depth, max_input_length, timeout,
+                   None if skip is None else tuple(tuple(rule) for rule in skip))
+            hash(key)
+        except TypeError:
+            pass
+        else:
+            return _cached_balance(*key)
+    return Balance(pairs, symmetrical, tags, ignore_case, cjk, straight, custom, german, math, engine, max_depth,
+                   max_input_length, timeout, skip)
+
+
+def cache_info():
+    """Return hits, misses, maximum and current size of the cache of Balance objects as a named tuple."""
+    return _cached_balance.cache_info()
+
+
+def cache_clear():
+    """Clear the cache of Balance objects and its statistics."""
+    _cached_balance.cache_clear()
+
+
+def set_cache_size(maxsize):
+    """Clear the cache of Balance objects and change its maximum size (None for unbounded, 0 to disable caching)."""
+    global _cached_balance
+    _cached_balance = functools.lru_cache(maxsize=maxsize)(_create_balance)
 
 
 def is_unbalanced(string, pairs=None, symmetrical=None, tags=False, ignore_case=False, cjk=False, straight=False,
-                  custom=False, german=False, math=False):
+                  custom=False, german=False, math=False, engine='trie', max_depth=None, max_input_length=None,
+                  timeout=None, skip=None):
     """Check if the string is balanced and return None or an Unbalanced object."""
-    balancer = Balance(pairs, symmetrical, tags, ignore_case, cjk, straight, custom, german, math)
+    balancer = _balance(pairs, symmetrical, tags, ignore_case, cjk, straight, custom, german, math, engine,
+                        max_depth, max_input_length, timeout, skip)
     return balancer.is_unbalanced(string)
+
+
+def is_balanced(string, pairs=None, symmetrical=None, tags=False, ignore_case=False, cjk=False, straight=False,
+                custom=False, german=False, math=False, engine='trie', max_depth=None, max_input_length=None,
+                timeout=None, skip=None):
+    """Check if the string is balanced and return True or False."""
+    balancer = _balance(pairs, symmetrical, tags, ignore_case, cjk, straight, custom, german, math, engine,
+                        max_depth, max_input_length, timeout, skip)
+    return balancer.is_balanced(string)
+
+
+def is_unbalanced_bytes(data, pairs=None, symmetrical=None, tags=False, ignore_case=False, cjk=False, straight=False,
+                        custom=False, german=False, math=False, engine='trie', max_depth=None,
+                        max_input_length=None, timeout=None, skip=None):
+    """Check if the UTF-8 encoded bytes-like object is balanced and return None or a BytesUnbalanced object."""
+    balancer = _balance(pairs, symmetrical, tags, ignore_case, cjk, straight, custom, german, math, engine,
+                        max_depth, max_input_length, timeout, skip)
+    return balancer.is_unbalanced_bytes(data)
+
+
+def check_file(path, pairs=None, symmetrical=None, tags=False, ignore_case=False, cjk=False, straight=False,
+               custom=False, german=False, math=False, engine='trie', max_depth=None, max_input_length=None,
+               timeout=None, skip=None):
+    """Check if the UTF-8 text file is balanced and return None or a FileUnbalanced object."""
+    balancer = _balance(pairs, symmetrical, tags, ignore_case, cjk, straight, custom, german, math, engine,
+                        max_depth, max_input_length, timeout, skip)
+    return balancer.check_file(path)
@@ -11,13 +11,21 @@ class Unbalanced:
         long_summary            The unmatched elements and the context between and around them as a string.
         unclosed                The opening element which was not closed or empty string.
 
+    An Unbalanced object keeps a reference to the string until compact() is called; the compact object keeps only the
+    context needed for the summaries. Unbalanced objects are always pickled in the compact form.
+
     Class constants:
         SUMMARY_TAIL_LENGTH     Standard length of the context around opening and closing elements.
         SUMMARY_MAX_TAIL_LENGTH Maximum length of the context around opening and closing elements.
+        COMPACT_CONTEXT_LENGTH  Length of the context kept around the unmatched elements by compact().
     """
 
+    __slots__ = ('_string', '_opening_length', '_opening_position', '_closing_length', '_closing_position',
+                 '_short_summary', '_long_summary')
+
     SUMMARY_TAIL_LENGTH = 3
     SUMMARY_MAX_TAIL_LENGTH = 5
+    COMPACT_CONTEXT_LENGTH = 64
 
     def __init__(self, string, opening_length, opening_position, closing_length=0, closing_position=0):
         """Initialize Unbalanced with opening length and position, and optional closing length and position."""
@@ -28,7 +36,6 @@ class Unbalanced:
         self._closing_position = closing_position
         self._short_summary = None
         self._long_summary = None
-        self._unclosed = self._string[self._opening_position:self._opening_position + self._opening_length]
 
     def _generate_short_summary(self):
         if self._opening_length == 0:
@@ -65,14 +72,14 @@ class Unbalanced:
     @property
     def short_summary(self):
         """Return the unclosed opening element and the context around it as a string."""
-        if not self._short_summary:
+        if self._short_summary is None:
             self._generate_short_summary()
         return self._short_summary
 
     @property
     def long_summary(self):
         """Return the unmatched elements and the context between and around them as a string."""
-        if not self._long_summary:
+        if self._long_summary is None:
             self._generate_long_summary()
         return self._long_summary
 
@@ -99,4 +106,78 @@ class Unbalanced:
     @property
     def unclosed(self):
         """Return the opening element which was not closed as a string or an empty string."""
-        return self._unclosed
+        return self._string[self._opening_position:self._opening_position + self._opening_length]
+
+    def compact(self):
+        """Return the same result which keeps only the context of the unmatched elements instead of the string.
+
+        The summaries of the compact object are the same, except that the text between unmatched elements more than
+        COMPACT_CONTEXT_LENGTH characters away from both of them is replaced with SparseString.GAP.
+        """
+        if isinstance(self._string, SparseString):
+            return self
+        tail = self.COMPACT_CONTEXT_LENGTH
+        length = len(self._string)
+        spans = [(self._opening_position, self._opening_length), (self._closing_position, self._closing_length)]
+        if not self._closing_position:  # The long summary runs to the end of the string
+            spans.append((length, 0))
+        parts = [(max(0, position - tail), self._string[max(0, position - tail):position + element_length + tail])
+                 for position, element_length in spans]
+        return Unbalanced(SparseString(length, parts), self._opening_length, self._opening_position,
+                          self._closing_length, self._closing_position)
+
+    def __reduce__(self):
+        compact = self.compact()
+        return Unbalanced, (compact._string, self._opening_length, self._opening_position,
+                            self._closing_length, self._closing_position)
+
+
+class SparseString:
+    """A string of which only some parts are kept, used as the source of Unbalanced built from streamed text.
+
+    Supports len() and slicing without step like str. The characters of a slice which were not kept are replaced
+    with a single GAP per missing range.
+
+    Class constants:
+        GAP                     The replacement for missing parts of the string.
+    """
+
+    __slots__ = ('_length', '_parts')
+
+    GAP = '...'
+
+    def __init__(self, length, parts):
+        """Initialize SparseString with the full length and a list of (position, text) parts which are kept."""
+        self._length = length
+        self._parts = []
+        for position, text in sorted(parts):
+            if self._parts and position <= self._parts[-1][0] + len(self._parts[-1][1]):  # Overlapping parts
+                last_position, last_text = self._parts[-1]
+                self._parts[-1] = (last_position, last_text + text[last_position + len(last_text) - position:])
+            elif text:
+                self._parts.append((position, text))
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice) or key.step not in (None, 1):
+            raise TypeError('SparseString supports only slices without step')
+        start, stop, _ = key.indices(self._length)
+
+        pieces = []
+        cursor = start
+        for position, text in self._parts:
+            end = position + len(text)
+            if end <= cursor:
+                continue
+            if position >= stop:
+                break
+            if position > cursor:
+                pieces.append(self.GAP)
+                cursor = position
+            pieces.append(text[cursor - position:min(stop, end) - position])
+            cursor = min(stop, end)
+        if cursor < stop:
+            pieces.append(self.GAP)
+        return ''.join(pieces)
@@ -0,0 +1,59 @@
+"""Checking strings with NumPy for the 'numpy' engine of Balance.
+
+The engine handles balancing parameters where every opening and closing element is a single character and there are no
+symmetrical elements, no tags and no skip rules. A string is checked in bulk: its characters are mapped to punctuation
+ids with a lookup table, the depth of the stack after every element is the cumulative sum of +1 for the openings and -1
+for the closings, and elements are paired by stable sorting on their level (the depth after an opening, the depth before
+a closing), which puts every opening right before its closing. The string is balanced if the depth never drops below
+zero, ends at zero, and every pair is allowed. Only unbalanced strings are scanned again to find the left-most
+unbalanced element.
+
+NumPy is an optional dependency, imported only with the 'numpy' engine.
+"""
+
+import numpy
+
+
+class VectorizedChecker:
+    """The lookup tables of a Balance object for the 'numpy' engine.
+
+    Exports method:
+        is_balanced(string)     Return True if the string is balanced, False otherwise.
+    """
+
+    def __init__(self, balance):
+        """Initialize VectorizedChecker with the compiled parameters of the Balance object."""
+        if balance._symmetrical or balance._tags or balance._skip_starts or balance._max_length > 1:
+            raise ValueError("engine 'numpy' requires single-character pairs without symmetrical, tags and skip rules")
+
+        lines = balance._openings + balance._closings
+        ids = {line: index for index, line in enumerate(lines, 1)}  # 0 stands for no punctuation
+        size = max([ord(line) for line in lines] or [0]) + 2  # Characters beyond the table map to its last entry, 0
+        self._ids = numpy.zeros(size, dtype=numpy.int32)
+        for line, index in ids.items():
+            self._ids[ord(line)] = index
+
+        self._steps = numpy.zeros(len(lines) + 1, dtype=numpy.int64)
+        self._steps[[ids[opening] for opening in balance._openings]] = 1
+        self._steps[[ids[closing] for closing in balance._closings]] = -1
+
+        self._allowed = numpy.zeros((len(lines) + 1, len(lines) + 1), dtype=bool)  # [opening id, closing id]
+        for closing, openings in balance._closing_openings.items():
+            for opening in openings:
+                self._allowed[ids[opening], ids[closing]] = True
+
+    def is_balanced(self, string):
+        """Return True if the string is balanced, False otherwise."""
+        codes = numpy.frombuffer(string.encode('utf-32-le', 'surrogatepass'), dtype=numpy.uint32)
+        ids = numpy.take(self._ids, codes, mode='clip')
+        ids = ids[ids != 0]
+        if not len(ids):
+            return True
+
+        steps = self._steps[ids]
+        depths = numpy.cumsum(steps)
+        if depths[-1] != 0 or depths.min() < 0:
+            return False
+        levels = depths + (steps < 0)
+        ids = ids[numpy.argsort(levels, kind='stable')]
+        return bool(self._allowed[ids[0::2], ids[1::2]].all())
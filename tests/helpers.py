@@ -0,0 +1,6 @@
+def positions(unbalanced):
+    """Return the positions and lengths of the Unbalanced object as a tuple, or None for None."""
+    if unbalanced is None:
+        return None
+    return (unbalanced.opening_length, unbalanced.opening_position,
+            unbalanced.closing_length, unbalanced.closing_position)
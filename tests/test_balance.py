@@ -1,5 +1,20 @@
+import array
+import os
+import pickle
+import random
+import re
+import subprocess
+import sys
+import threading
 import unittest
+from unittest import mock
 from balance import Balance
+from strbalance.scanner import LimitExceeded, Scanner
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 class TestBalancingExceptions(unittest.TestCase):
@@ -47,6 +62,10 @@ class TestBalancingExceptions(unittest.TestCase):
             with self.assertRaisesRegex(ValueError, "pairs must contain two elements each"):
                 Balance(pairs=pairs)
 
+    def test_unknown_engine(self):
+        with self.assertRaisesRegex(ValueError, "engine must be one of"):
+            Balance(engine='slices')
+
     def test_string_not_string(self):
         with self.assertRaisesRegex(TypeError, "first argument must be string"):
             balance = Balance()
@@ -112,6 +131,9 @@ class TestBalanceFlags(unittest.TestCase):
         self.assertIsNone(self.balance_without_flags.is_unbalanced(self.string_not_closed.format('<i>')))
         self.assertIsNotNone(balance_with_tags.is_unbalanced(self.string_not_closed.format('<i>')))
         self.assertIsNone(balance_with_tags.is_unbalanced(self.string_closed.format('<i>', '</i>')))
+        for letter in Balance.LATIN_LETTERS:
+            self.assertIsNotNone(balance_with_tags.is_unbalanced('<' + letter + '>'))
+        self.assertEqual(sorted(Balance.PUNCTUATION_TYPES), ['incomplete-tag', 'non-tag', 'opened-tag'])
 
     def test_ignore_case(self):
         balance_case_sensitive = Balance(tags=True)
@@ -121,6 +143,20 @@ class TestBalanceFlags(unittest.TestCase):
         self.assertIsNone(balance_case_insensitive.is_unbalanced(self.string_closed.format('<i>', '</i>')))
 
 
+class TestBalancePrecedence(unittest.TestCase):
+    def test_longest_sequence_first(self):
+        balance = Balance(pairs=[['((', '))']])
+        self.assertIsNone(balance.is_unbalanced('a((b))c'))
+        self.assertIsNone(balance.is_unbalanced('a((()b))c'))
+        unbalanced = balance.is_unbalanced('a((b)c')
+        self.assertEqual((unbalanced.opening_length, unbalanced.opening_position), (2, 1))
+
+    def test_closing_before_symmetrical_and_opening(self):
+        balance = Balance(custom=True, pairs=[['a', 'b'], ['bx', 'y']], symmetrical=['bz'])
+        self.assertIsNone(balance.is_unbalanced('abxabz'))
+        self.assertIsNotNone(Balance(custom=True, pairs=[['bx', 'y']]).is_unbalanced('abxa'))
+
+
 class TestBalanceGeneral(unittest.TestCase):
     # string, opening_length, opening_position, closing_length, closing_position
     simple_unbalanced_strings = [['(]', 1, 0, 1, 1],
@@ -157,12 +193,21 @@ class TestBalanceGeneral(unittest.TestCase):
                         '(?=^(([ac]*[bd]){2})*[ac]*$)(([bd]*[ac]){2})*[bd]*',
                         '{[]}[()]',
                         '{{[[(())]]}}',
+                        '<!DOCTYPE html><html lang="en"><!-- (comment --><h1 class=\'a>b\'>(x)</h1 ></html>',
+                        '<svg:g data-x="[" title=\'"\'><![CDATA[ <a> ( ]]></svg:g><?php echo ")"; ?>',
                         ]
 
     incomplete_tags = [['text<atext</a>', 6, 4, 0, 0],
                        ['text<atext<a>', 6, 4, 0, 0],
                        ['text<a>text</atext', 7, 11, 0, 0],
-                       ['text<a>text>text', 3, 4, 1, 11]]
+                       ['text<a>text>text', 3, 4, 1, 11],
+                       ['text<', 1, 4, 0, 0],
+                       ['text</', 1, 4, 0, 0],
+                       ['text<!-- comment', 4, 4, 0, 0],
+                       ['<![CDATA[ text', 9, 0, 0, 0],
+                       ['text<!DOCTYPE html', 2, 4, 0, 0],
+                       ['<a title="text>text</a>', 2, 0, 0, 0],
+                       ['<ab title=(text<a>', 3, 0, 0, 0]]
 
     def _unbalanced_assertions(self, unbalanced, opening_length, opening_position, closing_length, closing_position):
         self.assertEqual(unbalanced.opening_position, opening_position)
@@ -196,8 +241,566 @@ class TestBalanceGeneral(unittest.TestCase):
                 self._unbalanced_assertions(unbalanced, opening_length, opening_position,
                                             closing_length, closing_position)
 
+    def test_tag_lines(self):
+        balance = Balance(tags=True, ignore_case=True)
+        self.assertEqual(balance._read_tag('<DIV class="x">', 0), (balance.TAG_TOKENS['opening'], 15, '<div>'))
+        self.assertIs(balance._read_tag('<Div>', 0)[2], balance._read_tag('</dIV>', 0)[2])
+        self.assertEqual(balance._read_tag('<BR>', 0), (balance.TAG_TOKENS['skipped'], 4, None))
+        self.assertEqual(balance._read_tag('<p/>', 0), (balance.TAG_TOKENS['skipped'], 4, None))
+
     def test_balanced(self):
         balance = Balance(tags=True, straight=True)
         for string in self.balanced_strings:
             with self.subTest(msg=string):
                 self.assertIsNone(balance.is_unbalanced(string))
+
+
+class TestBalanceEngines(unittest.TestCase):
+    configurations = [{'tags': True}, {'tags': True, 'straight': True}, {'cjk': True, 'math': True},
+                      {'pairs': [['((', '))'], ['begin', 'end']], 'symmetrical': ['--']}, {'custom': True}]
+
+    strings = [line[0] for line in TestBalanceGeneral.simple_unbalanced_strings +
+               TestBalanceGeneral.complex_unbalanced_strings + TestBalanceGeneral.incomplete_tags] + \
+        TestBalanceGeneral.balanced_strings + ['((begin))--end--', 'plain text without punctuation', '']
+
+    @staticmethod
+    def _positions(unbalanced):
+        if unbalanced is None:
+            return None
+        return (unbalanced.opening_length, unbalanced.opening_position,
+                unbalanced.closing_length, unbalanced.closing_position)
+
+    def test_regex_engine_matches_trie_engine(self):
+        for configuration in self.configurations:
+            trie_balance = Balance(engine='trie', **configuration)
+            regex_balance = Balance(engine='regex', **configuration)
+            for string in self.strings:
+                with self.subTest(msg=string, configuration=configuration):
+                    self.assertEqual(self._positions(regex_balance.is_unbalanced(string)),
+                                     self._positions(trie_balance.is_unbalanced(string)))
+
+    def test_generated_engine_matches_trie_engine(self):
+        configurations = self.configurations + [
+            {}, {'math': True, 'pairs': [['(*', '*)']]}, {'pairs': [['<<', '>>']], 'symmetrical': ['**', '*']},
+            {'tags': True, 'ignore_case': True, 'skip': Balance.SKIP_CODE + Balance.SKIP_ESCAPES},
+            {'custom': True, 'tags': True}, {'custom': True}]
+        pieces = list('()[]{}«» ab"\'`\\<>/*') + ['<p>', '</p>', '<P x=">">', '</q>', '<br>', '<!--', '-->', '(*',
+                                                  '*)', 'begin', 'end', '--', '((', '))']
+        generator = random.Random(1)
+        for configuration in configurations:
+            trie_balance = Balance(engine='trie', **configuration)
+            generated_balance = Balance(engine='generated', **configuration)
+            strings = self.strings + [''.join(generator.choice(pieces) for _ in range(generator.randint(0, 30)))
+                                      for _ in range(300)]
+            for string in strings:
+                with self.subTest(msg=string, configuration=configuration):
+                    self.assertEqual(self._positions(generated_balance.is_unbalanced(string)),
+                                     self._positions(trie_balance.is_unbalanced(string)))
+
+    def test_generated_scan_is_shared(self):
+        self.assertIs(Balance(engine='generated', cjk=True)._generated_scan,
+                      Balance.loads(Balance(engine='generated', cjk=True).dumps())._generated_scan)
+        self.assertIsNot(Balance(engine='generated')._generated_scan,
+                         Balance(engine='generated', cjk=True)._generated_scan)
+
+    @unittest.skipIf(numpy is None, 'NumPy is not installed')
+    def test_numpy_engine_matches_trie_engine(self):
+        configurations = [{}, {'cjk': True, 'math': True}, {'german': True},
+                          {'pairs': [['<', '>'], ['日', '本']], 'custom': True}]
+        padding = ' plain text (with [{“balanced”}] punctuation) ' * 10
+        for configuration in configurations:
+            trie_balance = Balance(engine='trie', **configuration)
+            numpy_balance = Balance(engine='numpy', **configuration)
+            for string in self.strings + ['<日(>本)', '(((' + padding + ')))', '(' * 300 + ')' * 300,
+                                          '(' * 300 + ']' + ')' * 299, padding + '日<本>' + padding + ']']:
+                for padded in (string, padding + string, string + padding):
+                    with self.subTest(msg=padded, configuration=configuration):
+                        self.assertEqual(self._positions(numpy_balance.is_unbalanced(padded)),
+                                         self._positions(trie_balance.is_unbalanced(padded)))
+
+    @unittest.skipIf(numpy is None, 'NumPy is not installed')
+    def test_numpy_engine_parameters(self):
+        for configuration in [{'tags': True}, {'straight': True}, {'pairs': [['((', '))']]}]:
+            with self.assertRaisesRegex(ValueError, "engine 'numpy' requires"):
+                Balance(engine='numpy', **configuration)
+
+
+class TestBalanceSkip(unittest.TestCase):
+    # string, opening_length, opening_position, closing_length, closing_position (None if balanced)
+    strings = [['`(` [x] ``a)`` (b)', None],
+               ['```\n(code]\n```\n(text]', [1, 15, 1, 20]],
+               ['see (https://en.wikipedia.org/wiki/A_(b)), and [', [1, 47, 0, 0]],
+               ['\\( (\\]) \\\\]', [0, 0, 1, 10]],
+               ['(unclosed `code)', [1, 0, 0, 0]],
+               ['<p>`</p>`</p>', None],
+               ['<p title="`">(</p>`', [1, 13, 4, 14]]]
+
+    @staticmethod
+    def _positions(unbalanced):
+        if unbalanced is None:
+            return None
+        return [unbalanced.opening_length, unbalanced.opening_position,
+                unbalanced.closing_length, unbalanced.closing_position]
+
+    def test_regions(self):
+        for engine in ('trie', 'regex'):
+            balance = Balance(tags=True, engine=engine,
+                              skip=Balance.SKIP_ESCAPES + Balance.SKIP_CODE + Balance.SKIP_URLS)
+            for string, positions in self.strings:
+                with self.subTest(msg=string, engine=engine):
+                    self.assertEqual(self._positions(balance.is_unbalanced(string)), positions)
+                    self.assertEqual(balance.is_balanced(string), positions is None)
+                    self.assertEqual(self._positions(balance.is_unbalanced_chunks(string)), positions)
+                    bytes_result = balance.is_unbalanced_bytes(string.encode('utf-8'))
+                    self.assertEqual(self._positions(bytes_result and bytes_result.decoded()), positions)
+
+    def test_rules(self):
+        balance = Balance(skip=[['(*', '*)'], ['%', re.compile('$', re.MULTILINE)]])
+        self.assertIsNone(balance.is_unbalanced('(* ] *) % ]\n()'))
+        self.assertEqual(self._positions(balance.is_unbalanced('( (* ) *) % )\n]')), [1, 0, 1, 14])
+        self.assertIsNone(Balance(skip=[['`', '`'], ['`', '!']]).is_unbalanced('`(!)'))  # The first rule wins
+
+    def test_stream(self):
+        balance = Balance(skip=Balance.SKIP_CODE + Balance.SKIP_URLS)
+        string = 'a ``(`` b https://x.org/(' + 'a' * 500 + ') (c) ```\n' + ')' * 100 + '\n``` [d'
+        for size in (1, 7, 100):
+            with self.subTest(size=size):
+                unbalanced = balance.is_unbalanced_chunks(string[index:index + size]
+                                                          for index in range(0, len(string), size))
+                self.assertEqual(self._positions(unbalanced), [1, len(string) - 2, 0, 0])
+
+    def test_long_region_in_stream(self):
+        balance = Balance(skip=Balance.SKIP_CODE)
+        string = '(a ```' + '(code] ``\n' * 10000 + '``` b) [c ```' + ')' * 1000
+        stream = balance.stream()
+        longest = 0
+        for index in range(0, len(string), 1000):
+            self.assertIsNone(stream.feed(string[index:index + 1000]))
+            longest = max(longest, len(stream._string))  # The text searched already is dropped
+        self.assertLess(longest, 1100)
+        self.assertEqual(self._positions(stream.finish()), [1, 100013, 0, 0])
+        self.assertEqual(self._positions(balance.is_unbalanced(string)), [1, 100013, 0, 0])
+
+    def test_wrong_rules(self):
+        for skip, error in [('`', TypeError), ([['`']], ValueError), ([['', '`']], ValueError),
+                            ([['`', '']], ValueError), ([['`', re.compile(b'`')]], ValueError),
+                            ([['(', ')']], ValueError)]:
+            with self.subTest(skip=skip):
+                with self.assertRaises(error):
+                    Balance(skip=skip)
+
+    @unittest.skipIf(numpy is None, 'NumPy is not installed')
+    def test_numpy_engine(self):
+        with self.assertRaisesRegex(ValueError, "engine 'numpy' requires"):
+            Balance(engine='numpy', skip=Balance.SKIP_ESCAPES)
+
+
+class TestBalanceIsBalanced(unittest.TestCase):
+    configurations = TestBalanceEngines.configurations + [{'engine': 'regex', 'tags': True},
+                                                          {'pairs': [['<p>', 'x']], 'tags': True}]
+    strings = TestBalanceEngines.strings + ['<p>x', '<p></p>x', 'x<p>', '"a(b"c)', '"(")"', '<a>text>']
+
+    def test_same_results_as_is_unbalanced(self):
+        for configuration in self.configurations:
+            balance = Balance(**configuration)
+            for string in self.strings:
+                with self.subTest(msg=string, configuration=configuration):
+                    self.assertEqual(balance.is_balanced(string), balance.is_unbalanced(string) is None)
+
+    @unittest.skipIf(numpy is None, 'NumPy is not installed')
+    def test_numpy_engine(self):
+        balance = Balance(engine='numpy', cjk=True)
+        for string in ['(a)', '(a]', '「(' * 200 + ')」' * 200, '「(' * 200 + '」)' * 200, '(' * 300]:
+            with self.subTest(msg=string):
+                self.assertEqual(balance.is_balanced(string), Balance(cjk=True).is_unbalanced(string) is None)
+
+    def test_limits(self):
+        self.assertTrue(Balance(max_depth=2).is_balanced('(())'))
+        with self.assertRaises(LimitExceeded):
+            Balance(max_depth=2).is_balanced('((()))')
+
+    def test_not_string(self):
+        with self.assertRaisesRegex(TypeError, 'first argument must be string'):
+            Balance().is_balanced(b'()')
+
+
+class TestBalanceDumps(unittest.TestCase):
+    configurations = TestBalanceEngines.configurations + [
+        {}, {'german': True, 'straight': True, 'engine': 'regex', 'max_depth': 30, 'timeout': 1.5},
+        {'tags': True, 'ignore_case': True, 'skip': Balance.SKIP_ESCAPES + Balance.SKIP_URLS + [['`', '`']]}]
+
+    def test_same_results(self):
+        strings = TestBalanceIsBalanced.strings + [line[0] for line in TestBalanceSkip.strings] + ['<P>x</p>']
+        for configuration in self.configurations:
+            balance = Balance(**configuration)
+            loaded = Balance.loads(balance.dumps())
+            self.assertEqual(loaded.dumps(), balance.dumps())
+            for string in strings:
+                with self.subTest(msg=string, configuration=configuration):
+                    self.assertEqual(TestBalanceSkip._positions(loaded.is_unbalanced(string)),
+                                     TestBalanceSkip._positions(balance.is_unbalanced(string)))
+                    self.assertEqual(loaded.is_balanced(string), balance.is_balanced(string))
+
+    def test_pickle_after_checks(self):
+        strings = TestBalanceIsBalanced.strings + [line[0] for line in TestBalanceSkip.strings] + ['<P>x</p>']
+        engines = [engine for engine in Balance.ENGINES if engine != 'numpy' or numpy is not None]
+        for engine in engines:
+            if engine == 'numpy':
+                balance = Balance(engine=engine)
+            else:
+                balance = Balance(tags=True, straight=True, engine=engine, skip=Balance.SKIP_CODE)
+            for string in strings:  # Compiles everything compiled on first use
+                balance.is_unbalanced(string)
+                balance.is_balanced(string)
+                balance.find_pairs(string)
+                balance.is_unbalanced_bytes(string.encode())
+            balance.feed('(text')
+            with self.subTest(engine=engine):
+                loaded = pickle.loads(pickle.dumps(balance))
+                self.assertEqual(loaded.dumps(), balance.dumps())
+                self.assertIsNone(loaded.finish())  # The text passed to feed() is not copied
+                for string in strings:
+                    self.assertEqual(TestBalanceSkip._positions(loaded.is_unbalanced(string)),
+                                     TestBalanceSkip._positions(balance.is_unbalanced(string)))
+                    self.assertEqual(loaded.is_balanced(string), balance.is_balanced(string))
+
+    def test_wrong_data(self):
+        for data in [b'[]', b'{"format": 0}', Balance().dumps().replace(b'"format":1', b'"format":2')]:
+            with self.subTest(data=data):
+                with self.assertRaisesRegex(ValueError, 'data must be returned by Balance.dumps()'):
+                    Balance.loads(data)
+
+    def test_lazy_imports(self):
+        code = 'import sys, strbalance; strbalance.Balance().is_unbalanced("(a)"); ' \
+               'print(sorted(name for name in ("concurrent.futures", "numpy", "json", "re") if name in sys.modules))'
+        root = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+        output = subprocess.run([sys.executable, '-c', code], cwd=root, stdout=subprocess.PIPE,
+                                universal_newlines=True, check=True).stdout
+        self.assertEqual(output.strip(), '[]')
+
+
+class TestBalanceStream(unittest.TestCase):
+    def _positions(self, unbalanced):
+        return TestBalanceEngines._positions(unbalanced)
+
+    def _chunked(self, string, size):
+        return [string[i:i + size] for i in range(0, len(string), size)]
+
+    def test_chunks_match_whole_string(self):
+        strings = [line[0] for line in TestBalanceGeneral.simple_unbalanced_strings +
+                   TestBalanceGeneral.complex_unbalanced_strings + TestBalanceGeneral.incomplete_tags] + \
+            TestBalanceGeneral.balanced_strings
+        for engine in ('trie', 'regex'):
+            balance = Balance(tags=True, straight=True, engine=engine)
+            for string in strings:
+                for size in (1, 2, 3, 7):
+                    with self.subTest(msg=string, engine=engine, size=size):
+                        self.assertEqual(self._positions(balance.is_unbalanced_chunks(self._chunked(string, size))),
+                                         self._positions(balance.is_unbalanced(string)))
+
+    def test_sequences_across_chunks(self):
+        balance = Balance(tags=True, pairs=[['begin', 'end']])
+        self.assertIsNone(balance.is_unbalanced_chunks(['<div>be', 'gin(x)e', 'nd</d', 'iv>']))
+        unbalanced = balance.is_unbalanced_chunks(['<div>text</', 'span>'])
+        self.assertEqual(self._positions(unbalanced), (5, 0, 7, 9))
+
+    def test_global_positions(self):
+        balance = Balance()
+        chunks = ['abcdefghij' * 10] * 50 + ['abc(def', 'ghij' * 10 + ']klmnopq']
+        unbalanced = balance.is_unbalanced_chunks(chunks)
+        self.assertEqual(self._positions(unbalanced), (1, 5003, 1, 5047))
+        self.assertEqual(unbalanced.unclosed, '(')
+        self.assertEqual(unbalanced.short_summary, '...abc(def...')
+        self.assertEqual(unbalanced.long_summary, balance.is_unbalanced(''.join(chunks)).long_summary)
+
+    def test_feed_and_finish(self):
+        balance = Balance()
+        self.assertIsNone(balance.feed('(abc'))
+        self.assertIsNone(balance.feed('def)'))
+        self.assertIsNone(balance.finish())
+
+        self.assertIsNone(balance.feed('(abc'))
+        self.assertEqual(self._positions(balance.finish()), (1, 0, 0, 0))
+
+        self.assertIsNone(balance.feed('abc]'))  # Reported when the context after the closing is known
+        unbalanced = balance.feed('defghijkl')
+        self.assertEqual(self._positions(unbalanced), (0, 0, 1, 3))
+        self.assertIs(balance.feed('('), unbalanced)
+        self.assertIs(balance.finish(), unbalanced)
+
+    def test_stack_context_is_kept(self):
+        balance = Balance()
+        unbalanced = balance.is_unbalanced_chunks(['abcdefg(hijk'] + ['lmnop' * 100] * 20 + [']'])
+        self.assertEqual(unbalanced.short_summary, '...efg(hij...')
+        self.assertEqual(unbalanced.long_summary, '...efg(hijklm...lmnop]')
+        self.assertEqual(unbalanced.unclosed, '(')
+
+    def test_long_tags(self):
+        balance = Balance(tags=True)
+        for beginning, ending in [('<!--', '-->'), ('<a title="', '"></a>'), ("<a x='<' y='", "'></a>"),
+                                  ('<br title="', '">')]:
+            string = '(<p>' + beginning + 'text <p> ' * 10000 + ending + '</p>'
+            with self.subTest(beginning=beginning):
+                stream = balance.stream()
+                longest = 0
+                for chunk in self._chunked(string, 1000):
+                    self.assertIsNone(stream.feed(chunk))
+                    longest = max(longest, len(stream._string))  # The text read already is dropped
+                self.assertLess(longest, 1100)
+                self.assertEqual(self._positions(stream.finish()), (1, 0, 0, 0))
+                for end in (len(string) - len(ending) - 4, len(string) - 1):  # Incomplete tags and an unclosed one
+                    self.assertEqual(self._positions(balance.is_unbalanced_chunks(self._chunked(string[:end], 1000))),
+                                     self._positions(balance.is_unbalanced(string[:end])))
+
+    def test_chunk_not_string(self):
+        with self.assertRaisesRegex(TypeError, "chunk must be string"):
+            Balance().feed(b'abc')
+
+
+class TestBalanceCheckMany(unittest.TestCase):
+    strings = [line[0] for line in TestBalanceGeneral.simple_unbalanced_strings +
+               TestBalanceGeneral.complex_unbalanced_strings] + TestBalanceGeneral.balanced_strings
+
+    def test_results_in_input_order(self):
+        balance = Balance(tags=True, straight=True)
+        expected = [TestBalanceEngines._positions(balance.is_unbalanced(string)) for string in self.strings]
+        for workers in (0, 2):
+            with self.subTest(workers=workers):
+                results = list(balance.check_many(iter(self.strings * 3), workers=workers, chunksize=4))
+                self.assertEqual([TestBalanceEngines._positions(result) for result in results], expected * 3)
+                self.assertEqual([result and result.short_summary for result in results[:len(self.strings)]],
+                                 [result and result.short_summary for result in map(balance.is_unbalanced,
+                                                                                    self.strings)])
+
+    def test_invalid_chunksize(self):
+        for chunksize in (0, -1):
+            for workers in (0, 2):
+                with self.subTest(chunksize=chunksize, workers=workers):
+                    with self.assertRaises(ValueError):
+                        Balance().check_many(self.strings, workers=workers, chunksize=chunksize)
+
+
+class TestBalanceParallel(unittest.TestCase):
+    def test_chunks_match_whole_string(self):
+        for configuration in TestBalanceEngines.configurations:
+            balance = Balance(**configuration)
+            for string in TestBalanceEngines.strings:
+                for chunk_size in (1, 2, 5):
+                    with self.subTest(msg=string, configuration=configuration, chunk_size=chunk_size):
+                        self.assertEqual(
+                            TestBalanceEngines._positions(balance.is_unbalanced_parallel(string, 0, chunk_size)),
+                            TestBalanceEngines._positions(balance.is_unbalanced(string)))
+
+    def test_seams(self):
+        # Symmetrical quotes and tags opened in one chunk and closed in another
+        balance = Balance(tags=True, straight=True)
+        strings = ['"a <b> \'c (d) e\' f</b> g" ' * 50, '<p> "a b" </p> "c <i>d</i> (e' * 20 + '" ) ',
+                   "'a' b ' c ' " * 30 + "'"]
+        for string in strings:
+            for chunk_size in (3, 7, 50):
+                with self.subTest(msg=string[:30], chunk_size=chunk_size):
+                    self.assertEqual(
+                        TestBalanceEngines._positions(balance.is_unbalanced_parallel(string, 0, chunk_size)),
+                        TestBalanceEngines._positions(balance.is_unbalanced(string)))
+
+    def test_workers(self):
+        balance = Balance(tags=True)
+        string = '<div>(a [b] {c})</div> ' * 1000 + '(<i>x]</i>' + ' y' * 1000
+        unbalanced = balance.is_unbalanced_parallel(string, workers=2, chunk_size=1000)
+        self.assertEqual(TestBalanceEngines._positions(unbalanced), (3, 23001, 1, 23005))
+        self.assertEqual(unbalanced.short_summary, balance.is_unbalanced(string).short_summary)
+        self.assertIsNone(balance.is_unbalanced_parallel('(a) ' * 1000, workers=2, chunk_size=100))
+
+    def test_limits(self):
+        for parameters, string in [({'max_depth': 3}, '(a(b(c(d)c)b)a)'),
+                                   ({'max_input_length': 10}, '(a(b(c)b)a) ' * 3),
+                                   ({'max_depth': 2, 'tags': True}, '<p>(' * 2 + 'a' * 100)]:
+            balance = Balance(**parameters)
+            errors = []
+            for check in (balance.is_unbalanced, lambda string: balance.is_unbalanced_parallel(string, 0, 2)):
+                with self.assertRaises(LimitExceeded) as context:
+                    check(string)
+                errors.append((context.exception.limit, context.exception.position, context.exception.depth))
+            self.assertEqual(errors[0], errors[1])
+        self.assertIsNone(Balance(max_depth=4).is_unbalanced_parallel('(a(b(c(d)c)b)a)', 0, 2))
+
+    def test_not_string(self):
+        with self.assertRaises(TypeError):
+            Balance().is_unbalanced_parallel(None)
+
+
+class TestBalanceThreads(unittest.TestCase):
+    def test_shared_balance(self):
+        balance = Balance(tags=True, straight=True)
+        strings = [line[0] for line in TestBalanceGeneral.simple_unbalanced_strings +
+                   TestBalanceGeneral.complex_unbalanced_strings + TestBalanceGeneral.incomplete_tags] + \
+            TestBalanceGeneral.balanced_strings
+        strings += ['<p>' + '(' * depth + '«»' * depth + ')' * depth + '</p>' for depth in range(50)]
+        expected = [TestBalanceEngines._positions(balance.is_unbalanced(string)) for string in strings]
+        state = dict(vars(balance))
+        failures = []
+
+        def check(shift):
+            for repetition in range(30):
+                for index in range(len(strings)):
+                    index = (index + shift) % len(strings)
+                    if TestBalanceEngines._positions(balance.is_unbalanced(strings[index])) != expected[index]:
+                        failures.append(strings[index])
+                stream = balance.stream()
+                for string in strings[shift % 5::5]:
+                    stream.feed(string)
+                stream.finish()
+
+        threads = [threading.Thread(target=check, args=(shift,)) for shift in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(failures, [])
+        self.assertEqual(vars(balance), state)
+
+
+class TestBalanceFindAll(unittest.TestCase):
+    # string, [[opening_length, opening_position, closing_length, closing_position], ...]
+    strings = [['a)b(c]d{e', [[0, 0, 1, 1], [1, 3, 1, 5], [1, 7, 0, 0], [1, 3, 0, 0]]],
+               ['([)]', [[1, 1, 1, 2], [0, 0, 1, 3]]],
+               ['(a[b{c)d', [[1, 4, 1, 6], [1, 2, 0, 0]]],
+               ['<p><i>x</p>', [[3, 3, 4, 7]]],
+               ['a<b c</b>', [[2, 1, 0, 0], [0, 0, 4, 5]]],
+               ['x < y (z)', [[1, 2, 0, 0]]],
+               [')))', [[0, 0, 1, 0], [0, 0, 1, 1], [0, 0, 1, 2]]],
+               ['(((', [[1, 2, 0, 0], [1, 1, 0, 0], [1, 0, 0, 0]]],
+               ['{[]}[()]', []]]
+
+    def test_all_results(self):
+        balance = Balance(tags=True, straight=True)
+        for string, expected in self.strings:
+            with self.subTest(msg=string):
+                self.assertEqual([list(TestBalanceEngines._positions(unbalanced))
+                                  for unbalanced in balance.find_all(string)], expected)
+
+    def test_first_result(self):
+        balance = Balance(tags=True, straight=True)
+        for string in TestBalanceEngines.strings:
+            with self.subTest(msg=string):
+                self.assertEqual(TestBalanceEngines._positions(next(balance.find_all(string), None)),
+                                 TestBalanceEngines._positions(balance.is_unbalanced(string)))
+
+    def test_lazy(self):
+        results = Balance().find_all(')' * 100000)
+        self.assertEqual(next(results).closing_position, 0)
+        self.assertEqual(next(results).closing_position, 1)
+
+
+class TestBalanceFindPairs(unittest.TestCase):
+    # string, [[opening_position, opening_length, closing_position, closing_length, depth, opening element], ...]
+    strings = [['a (b [c] "d") e', [[5, 1, 7, 1, 1, '['], [9, 1, 11, 1, 1, '"'], [2, 1, 12, 1, 0, '(']]],
+               ['<p class="x">«<i>y</I>»</p>', [[14, 3, 18, 4, 2, '<i>'], [13, 1, 22, 1, 1, '«'],
+                                               [0, 13, 23, 4, 0, '<p>']]],
+               ['(b) (a]', [[0, 1, 2, 1, 0, '(']]],
+               ['(`)` [x])', [[5, 1, 7, 1, 1, '['], [0, 1, 8, 1, 0, '(']]],
+               ['(x) ((y)', [[0, 1, 2, 1, 0, '('], [5, 1, 7, 1, 1, '(']]],
+               ['no pairs', []]]
+
+    @staticmethod
+    def _rows(table):
+        return [[table.opening_positions[index], table.opening_lengths[index], table.closing_positions[index],
+                 table.closing_lengths[index], table.depths[index], table.delimiters[table.ids[index]]]
+                for index in range(len(table))]
+
+    def test_pairs(self):
+        for engine in Balance.ENGINES[:2]:
+            balance = Balance(tags=True, ignore_case=True, straight=True, skip=[['`', '`']], engine=engine)
+            for string, expected in self.strings:
+                with self.subTest(msg=string, engine=engine):
+                    self.assertEqual(self._rows(balance.find_pairs(string)), expected)
+
+    def test_columns(self):
+        table = Balance().find_pairs('(' * 1000 + ')' * 1000)
+        self.assertEqual(len(table), 1000)
+        for column in (table.opening_positions, table.opening_lengths, table.closing_positions,
+                       table.closing_lengths, table.depths, table.ids):
+            self.assertIsInstance(column, array.array)
+            self.assertEqual(column.typecode, 'l')
+        self.assertEqual(list(table.depths), list(range(999, -1, -1)))
+
+    def test_same_unbalanced_as_is_unbalanced(self):
+        for configuration in TestBalanceIsBalanced.configurations:
+            balance = Balance(**configuration)
+            for string in TestBalanceIsBalanced.strings:
+                with self.subTest(msg=string, configuration=configuration):
+                    self.assertEqual(TestBalanceEngines._positions(balance.find_pairs(string).unbalanced),
+                                     TestBalanceEngines._positions(balance.is_unbalanced(string)))
+
+    def test_limits(self):
+        self.assertEqual(len(Balance(max_depth=2).find_pairs('(())')), 2)
+        with self.assertRaises(LimitExceeded) as context:
+            Balance(max_depth=2).find_pairs('((()))')
+        self.assertEqual((context.exception.position, context.exception.depth), (3, 3))
+        for parameters, string in [({'max_input_length': 5}, '(text) ' * 2), ({'max_depth': 3}, 'a (<b>(« x')]:
+            balance = Balance(tags=True, **parameters)
+            errors = []
+            for check in (balance.find_pairs, balance.is_unbalanced):
+                with self.assertRaises(LimitExceeded) as context:
+                    check(string)
+                errors.append((context.exception.limit, context.exception.position, context.exception.depth))
+            self.assertEqual(errors[0], errors[1])  # The same checks of the limits as is_unbalanced()
+
+    def test_not_string(self):
+        with self.assertRaisesRegex(TypeError, 'first argument must be string'):
+            Balance().find_pairs(b'()')
+
+
+class TestBalanceLimits(unittest.TestCase):
+    def _exceeded(self, check):
+        with self.assertRaises(LimitExceeded) as context:
+            check()
+        return context.exception.limit, context.exception.position, context.exception.depth
+
+    def test_max_depth(self):
+        for engine in ('trie', 'regex'):
+            with self.subTest(engine=engine):
+                balance = Balance(max_depth=3, engine=engine)
+                self.assertIsNone(balance.is_unbalanced('((( ))) [{<>}]'))
+                self.assertEqual(self._exceeded(lambda: balance.is_unbalanced('ab(((«x»)))')), ('max_depth', 6, 4))
+                self.assertEqual(self._exceeded(lambda: list(balance.find_all('ab(((«x»)))]'))), ('max_depth', 6, 4))
+
+    def test_max_input_length(self):
+        balance = Balance(max_input_length=4)
+        self.assertIsNotNone(balance.is_unbalanced('(abc'))
+        self.assertEqual(self._exceeded(lambda: balance.is_unbalanced('(abcd)')), ('max_input_length', 0, 0))
+        self.assertEqual(self._exceeded(lambda: balance.is_unbalanced_bytes('(éé)'.encode())),
+                         ('max_input_length', 0, 0))
+        self.assertIsNone(balance.feed('(ab'))
+        self.assertEqual(self._exceeded(lambda: balance.feed('cd)')), ('max_input_length', 3, 1))
+
+    def test_timeout(self):
+        balance = Balance(timeout=0)
+        limit, position, depth = self._exceeded(lambda: balance.is_unbalanced('x' * 100000))
+        self.assertEqual((limit, position % Scanner.LIMIT_CHECK_INTERVAL, depth), ('timeout', 0, 0))
+        self.assertIsNone(Balance(timeout=60).is_unbalanced('(' + 'x' * 100000 + ')'))
+
+    def test_same_results_within_limits(self):
+        strings = [line[0] for line in TestBalanceGeneral.simple_unbalanced_strings +
+                   TestBalanceGeneral.complex_unbalanced_strings + TestBalanceGeneral.incomplete_tags] + \
+            TestBalanceGeneral.balanced_strings
+        with mock.patch.object(Scanner, 'LIMIT_CHECK_INTERVAL', 2):
+            for engine in ('trie', 'regex'):
+                balance = Balance(tags=True, straight=True, engine=engine)
+                limited = Balance(tags=True, straight=True, engine=engine, max_depth=100, max_input_length=1000,
+                                  timeout=60)
+                for string in strings:
+                    with self.subTest(msg=string, engine=engine):
+                        self.assertEqual(TestBalanceEngines._positions(limited.is_unbalanced(string)),
+                                         TestBalanceEngines._positions(balance.is_unbalanced(string)))
+
+    def test_exception(self):
+        exception = pickle.loads(pickle.dumps(LimitExceeded('max_depth', 10, 3)))
+        self.assertEqual((exception.limit, exception.position, exception.depth), ('max_depth', 10, 3))
+        self.assertEqual(str(exception), 'max_depth exceeded at position 10 with depth 3')
+
+    def test_wrong_limits(self):
+        for limits in ({'max_depth': -1}, {'max_input_length': '10'}, {'timeout': True}):
+            with self.assertRaisesRegex(ValueError, 'must be None or a non-negative number'):
+                Balance(**limits)
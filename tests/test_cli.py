@@ -0,0 +1,116 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+import cli
+from balance import Balance
+
+
+class TestCommandLine(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.files = {'a.txt': 'balanced (text)\n', 'b.txt': 'first line\nsecond «line]\n',
+                      os.path.join('sub', 'c.html'): '<p>text</div>', os.path.join('.hidden', 'd.txt'): '(',
+                      os.path.join('sub', 'e.txt'): 'ends (open'}
+        for name, text in self.files.items():
+            self._write(name, text.encode('utf-8'))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def _write(self, name, data):
+        os.makedirs(os.path.dirname(self._path(name)), exist_ok=True)
+        with open(self._path(name), 'wb') as file:
+            file.write(data)
+
+    def _run(self, *arguments):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            status = cli.main(list(arguments))
+        return status, output.getvalue().splitlines()
+
+    def test_text_output(self):
+        status, lines = self._run(self.directory.name)
+        self.assertEqual(status, cli.UNBALANCED)
+        self.assertEqual(lines, [self._path('b.txt') + ":2:8: '«' is closed by ']' at 2:13: ...nd «line]\\n",
+                                 self._path(os.path.join('sub', 'e.txt')) + ":1:6: '(' is not closed: ends (open"])
+
+        status, lines = self._run('--tags', '--all', '--pattern', '*.html', '--pattern', 'a.*', self.directory.name)
+        self.assertEqual(status, cli.UNBALANCED)
+        self.assertEqual(lines, [self._path('a.txt') + ': balanced',
+                                 self._path(os.path.join('sub', 'c.html')) + ":1:1: '<p>' is closed by '</div>' at "
+                                                                             "1:8: <p>text</div>"])
+
+    def test_json_output_and_exit_codes(self):
+        self._write('invalid.txt', b'(\xff)')
+        status, lines = self._run('--format', 'json', '--custom', '--pair', '«', ']', self._path('b.txt'),
+                                  self._path('a.txt'), self._path('invalid.txt'), self._path('missing.txt'))
+        self.assertEqual(status, cli.ERROR)
+        records = [json.loads(line) for line in lines]
+        self.assertEqual([record['path'] for record in records],
+                         [self._path('invalid.txt'), self._path('missing.txt')])
+        self.assertTrue(all('error' in record for record in records))
+
+        status, lines = self._run('--format', 'json', '--all', self._path('b.txt'))
+        self.assertEqual(status, cli.UNBALANCED)
+        self.assertEqual(json.loads(lines[0]), {
+            'path': self._path('b.txt'), 'balanced': False, 'summary': '...nd «line]\n',
+            'opening': {'element': '«', 'position': 18, 'line': 2, 'column': 8},
+            'closing': {'element': ']', 'position': 23, 'line': 2, 'column': 13}})
+        self.assertEqual(self._run(self._path('a.txt'))[0], cli.BALANCED)
+
+    def test_workers(self):
+        self.assertEqual(self._run('--workers', '2', '--all', self.directory.name),
+                         self._run('--all', self.directory.name))
+
+    def test_cache(self):
+        cache = self._path('.cache.json')
+        arguments = ['--all', '--cache', cache, self.directory.name]
+        expected = self._run(*arguments)
+        with mock.patch.object(cli, '_check', side_effect=AssertionError('checked again')):
+            self.assertEqual(self._run(*arguments), expected)
+
+        # Changed files and other parameters are checked again
+        self._write('a.txt', b'now (unbalanced')
+        checked = []
+        with mock.patch.object(cli, '_check', side_effect=lambda path: checked.append(path) or {'balanced': True}):
+            self._run(*arguments)
+            self._run('--straight', *arguments)
+        self.assertEqual(checked[0], self._path('a.txt'))
+        self.assertEqual(len(checked), 1 + 4)
+
+    def test_limits(self):
+        status, lines = self._run('--max-depth', '0', self._path('a.txt'))
+        self.assertEqual(status, cli.ERROR)
+        self.assertEqual(lines, [self._path('a.txt') + ': error: max_depth exceeded at position 10 with depth 1'])
+
+    def test_large_file(self):
+        text = 'ünïcödé line\n' * 200000 + 'the (last] line\n'  # Several chunks of Balance.FILE_CHUNK_SIZE bytes
+        self._write('large.txt', text.encode('utf-8'))
+        status, lines = self._run('--format', 'json', self._path('large.txt'))
+        self.assertEqual(status, cli.UNBALANCED)
+        record = json.loads(lines[0])
+        self.assertEqual(record['opening'], {'element': '(', 'position': 2600004, 'line': 200001, 'column': 5})
+        self.assertEqual(record['closing'], {'element': ']', 'position': 2600009, 'line': 200001, 'column': 10})
+        self.assertEqual(record['summary'], Balance().is_unbalanced(text).long_summary)
+
+    def test_skip(self):
+        self._write('code.md', b'Call `f(x]` (see `[`)\n')
+        self.assertEqual(self._run(self._path('code.md'))[0], cli.UNBALANCED)
+        self.assertEqual(self._run('--skip-code', self._path('code.md'))[0], cli.BALANCED)
+        self.assertEqual(self._run('--skip', '`', '`', self._path('code.md'))[0], cli.BALANCED)
+
+        cache = self._path('.cache.json')
+        self.assertEqual(self._run('--skip-urls', '--cache', cache, self._path('code.md'))[0], cli.UNBALANCED)
+
+    def test_wrong_parameters(self):
+        with contextlib.redirect_stderr(io.StringIO()):
+            with self.assertRaises(SystemExit) as context:
+                cli.main(['--tags', '--pair', '<', '>', self.directory.name])
+        self.assertEqual(context.exception.code, cli.ERROR)
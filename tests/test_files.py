@@ -0,0 +1,182 @@
+import mmap
+import os
+import pickle
+import tempfile
+import unittest
+from unittest import mock
+from balance import Balance
+from files import MappedText
+from strbalance.scanner import LimitExceeded
+from helpers import positions
+
+
+class TestCheckFile(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _write(self, text):
+        path = os.path.join(self.directory.name, 'text.txt')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(text)
+        return path
+
+    def test_balanced_and_empty_files(self):
+        balance = Balance(tags=True)
+        self.assertIsNone(balance.check_file(self._write('')))
+        self.assertIsNone(balance.check_file(self._write('<p>«Ünïcödé» (text)</p>\n' * 1000), chunk_size=7))
+
+    def test_character_and_byte_positions(self):
+        text = 'ÿ日本(語' * 3 + ' é]tail text'
+        path = self._write(text)
+        for chunk_size in (1, 2, 5, 1024):
+            with self.subTest(chunk_size=chunk_size):
+                unbalanced = Balance().check_file(path, chunk_size=chunk_size)
+                expected = Balance().is_unbalanced(text)
+                self.assertEqual((unbalanced.opening_position, unbalanced.closing_position),
+                                 (expected.opening_position, expected.closing_position))
+                self.assertEqual(unbalanced.opening_byte_position, len(text[:expected.opening_position].encode()))
+                self.assertEqual(unbalanced.closing_byte_position, len(text[:expected.closing_position].encode()))
+                self.assertEqual(unbalanced.closing_byte_length, 1)
+                self.assertEqual(unbalanced.short_summary, expected.short_summary)
+                self.assertEqual(unbalanced.long_summary, expected.long_summary)
+
+    def test_characters_split_between_decoding_chunks(self):
+        text = '日本語のテキスト' * 3750 + '(' + 'です' * 10  # Longer than MappedText.DECODING_CHUNK_SIZE bytes
+        path = self._write(text)
+        expected = Balance(cjk=True).is_unbalanced(text)
+        for unbalanced in (Balance(cjk=True).check_file(path), Balance(cjk=True).is_unbalanced_bytes(text.encode())):
+            with self.subTest(result=type(unbalanced).__name__):
+                self.assertEqual((unbalanced.unclosed, unbalanced.short_summary, unbalanced.long_summary),
+                                 (expected.unclosed, expected.short_summary, expected.long_summary))
+        self.assertEqual(Balance(cjk=True).check_file(path).opening_byte_position, 90000)
+
+    def test_long_summary_is_shortened(self):
+        text = 'abc(' + 'é' * 10000 + ']'
+        unbalanced = Balance().check_file(self._write(text), chunk_size=100)
+        self.assertEqual(unbalanced.closing_position, 10004)
+        self.assertLessEqual(len(unbalanced.long_summary), MappedText.MAX_SLICE_LENGTH + 10)
+        self.assertTrue(unbalanced.long_summary.startswith('abc(éé'))
+        self.assertTrue(unbalanced.long_summary.endswith('éé]'))
+
+    def test_location(self):
+        text = 'ÿ日本\n(語\n\n' + 'é' * 100000 + '\nab]'
+        unbalanced = Balance().check_file(self._write(text), chunk_size=1000)
+        self.assertEqual(unbalanced.text.location(unbalanced.opening_position), (2, 1))
+        self.assertEqual(unbalanced.text.location(unbalanced.closing_position), (5, 3))
+        self.assertEqual(unbalanced.text.location(0), (1, 1))
+        self.assertEqual(unbalanced.text.location(len(text) - 5), (4, 100000))
+
+    def test_invalid_utf8(self):
+        path = os.path.join(self.directory.name, 'binary.txt')
+        with open(path, 'wb') as file:
+            file.write(b'(abc\xff)')
+        with self.assertRaises(UnicodeDecodeError):
+            Balance().check_file(path)
+
+    def test_mapping_closed_on_errors(self):
+        mappings = []
+        original = mmap.mmap
+
+        def mapping(*arguments, **keywords):
+            mappings.append(original(*arguments, **keywords))
+            return mappings[-1]
+
+        path = self._write('((((x))))' * 10)
+        with mock.patch('mmap.mmap', side_effect=mapping):
+            for balance in (Balance(max_depth=2), Balance(max_input_length=10)):
+                with self.assertRaises(LimitExceeded):
+                    balance.check_file(path, chunk_size=7)
+            with open(path, 'ab') as file:
+                file.write(b'\xff')
+            with self.assertRaises(UnicodeDecodeError):
+                Balance().check_file(path, chunk_size=7)
+        self.assertEqual(len(mappings), 3)
+        self.assertTrue(all(mapping.closed for mapping in mappings))
+
+
+class TestBytes(unittest.TestCase):
+    configurations = [{}, {'cjk': True, 'german': True}, {'tags': True, 'straight': True, 'ignore_case': True},
+                      {'pairs': [['«é', 'é»'], ['日', '本']], 'symmetrical': ['ÿ', '--'], 'custom': True},
+                      {'tags': True, 'engine': 'regex', 'math': True}]
+    strings = ['', 'plain text', '(«Ünïcödé» [text])', 'ÿ日本(語' * 3 + ' é]tail text', '„zitat“ »noch« ›eins‹ (',
+               '「日本語」（テキスト］', '<p title="«>">Ünï</P> <br> <!-- ( --> <Ä>', '<div>text</di', '"it\'s" "(',
+               '«éaé» 日ÿ本ÿ -- (--', 'a)b', 'é' * 20 + '[' + 'ü' * 20]
+
+    def test_same_results_as_strings(self):
+        for configuration in self.configurations:
+            balance = Balance(**configuration)
+            for string in self.strings:
+                with self.subTest(string=string, configuration=configuration):
+                    expected = balance.is_unbalanced(string)
+                    unbalanced = balance.is_unbalanced_bytes(string.encode())
+                    if expected is None:
+                        self.assertIsNone(unbalanced)
+                        continue
+                    self.assertEqual(positions(unbalanced.decoded()), positions(expected))
+                    self.assertEqual(unbalanced.opening_position, len(string[:expected.opening_position].encode()))
+                    self.assertEqual(unbalanced.closing_position, len(string[:expected.closing_position].encode()))
+                    self.assertEqual(unbalanced.opening_length, len(expected.unclosed.encode()))
+                    self.assertEqual((unbalanced.unclosed, unbalanced.short_summary, unbalanced.long_summary),
+                                     (expected.unclosed, expected.short_summary, expected.long_summary))
+
+    def test_bytes_like_objects(self):
+        data = 'ÿ日本(語 é]'.encode()
+        with tempfile.TemporaryFile() as file:
+            file.write(data)
+            file.flush()
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapping:
+                for value in (data, bytearray(data), memoryview(data), memoryview(bytearray(data)).cast('c'),
+                              mapping):
+                    with self.subTest(value=value):
+                        unbalanced = Balance().is_unbalanced_bytes(value)
+                        self.assertEqual(positions(unbalanced), (1, 8, 1, 15))
+                        self.assertEqual(positions(unbalanced.decoded()), (1, 3, 1, 7))
+                        self.assertEqual(unbalanced.long_summary, 'ÿ日本(語 é]')
+        with self.assertRaises(TypeError):
+            Balance().is_unbalanced_bytes('(text)')
+
+    def test_bytes_like_objects_with_skip_rules(self):
+        balance = Balance(tags=True, skip=Balance.SKIP_CODE + Balance.SKIP_ESCAPES + Balance.SKIP_URLS)
+        for string in ['````{', '(`é]` \\] https://é.org/(a) ```\n)\n```', '<p>`</p>` «(»</p>', '``é``{']:
+            expected = balance.is_unbalanced(string)
+            for value in (string.encode(), bytearray(string.encode()), memoryview(string.encode())):
+                with self.subTest(string=string, value=value):
+                    unbalanced = balance.is_unbalanced_bytes(value)
+                    self.assertEqual(unbalanced and positions(unbalanced.decoded()),
+                                     expected and positions(expected))
+
+    def test_whitespace_in_tags(self):
+        balance = Balance(tags=True)
+        for space in [' ', '\t\n', '\xa0', '\u3000', '\u2028', '\x0b', '\x1c']:
+            for string in ['<p>x</p' + space + '>', '<p>x</p' + space + '>(', '<p' + space + 'title="é">x</p>']:
+                with self.subTest(string=string):
+                    expected = balance.is_unbalanced(string)
+                    unbalanced = balance.is_unbalanced_bytes(string.encode())
+                    self.assertEqual(unbalanced and positions(unbalanced.decoded()),
+                                     expected and positions(expected))
+        self.assertIsNone(balance.is_unbalanced('<p>x</p \t\r\n\f>'))
+        self.assertEqual(positions(balance.is_unbalanced('<p>x</p\xa0>')), (1, 4, 0, 0))  # Not HTML whitespace
+
+    def test_unicode_classes_in_skip_patterns(self):
+        balance = Balance(skip=Balance.SKIP_URLS)
+        for string in ['https://é.org/a (b]', 'https://é.org/a　(b]', 'https://x.org/a\x1c)',
+                       'https://x.org/(a) ' + 'é' * 5000 + ']', 'see https://x.org/' + 'é' * 5000 + ' (]',
+                       'https://x.org/ ' * 1000 + '(]']:
+            with self.subTest(string=string[:30]):
+                expected = balance.is_unbalanced(string)
+                unbalanced = balance.is_unbalanced_bytes(string.encode())
+                self.assertIsNotNone(expected)
+                self.assertEqual(positions(unbalanced.decoded()), positions(expected))
+
+    def test_compact_and_pickle(self):
+        unbalanced = Balance().is_unbalanced_bytes(('é' * 100 + '(' + 'ü' * 50 + ']').encode())
+        for result in (unbalanced.compact(), pickle.loads(pickle.dumps(unbalanced))):
+            with self.subTest(result=result):
+                self.assertIsNone(result._string)
+                self.assertEqual(positions(result), (1, 200, 1, 301))
+                self.assertEqual(positions(result.decoded()), (1, 100, 1, 151))
+                self.assertEqual((result.short_summary, result.long_summary),
+                                 (unbalanced.short_summary, unbalanced.long_summary))
@@ -0,0 +1,64 @@
+import random
+import unittest
+from balance import Balance
+from incremental import IncrementalScanner
+from helpers import positions
+
+
+class SmallIntervalScanner(IncrementalScanner):
+    CHECKPOINT_INTERVAL = 4
+
+
+class TestIncrementalScanner(unittest.TestCase):
+    configurations = [{}, {'tags': True, 'straight': True}, {'pairs': [['((', '))'], ['begin', 'end']],
+                                                            'symmetrical': ['--']}]
+    pieces = ['(', ')', '[', ']', '"', "'", '<a>', '</a>', '<br>', '<', '>', '/', 'begin', 'end', '--', 'x', ' ', '  ']
+
+    def test_edits_match_whole_text(self):
+        generator = random.Random(1)
+        for configuration in self.configurations:
+            balance = Balance(**configuration)
+            for _ in range(50):
+                text = ''.join(generator.choice(self.pieces) for _ in range(generator.randint(0, 40)))
+                scanner = SmallIntervalScanner(balance, text)
+                for _ in range(20):
+                    start = generator.randint(0, len(text))
+                    end = generator.randint(start, min(len(text), start + 3))
+                    new_text = ''.join(generator.choice(self.pieces) for _ in range(generator.randint(0, 2)))
+                    text = text[:start] + new_text + text[end:]
+                    with self.subTest(msg=text, configuration=configuration):
+                        self.assertEqual(positions(scanner.apply_edit(start, end, new_text)),
+                                         positions(balance.is_unbalanced(text)))
+                        self.assertEqual(scanner.text, text)
+
+    def test_checkpoints_after_edit_are_kept(self):
+        scanner = SmallIntervalScanner(Balance(), '(a) [b] {c} ' * 20)
+        last_checkpoint = scanner._checkpoints[-1]
+        self.assertIsNone(scanner.apply_edit(5, 6, 'bb'))
+        self.assertIs(scanner._checkpoints[-1][1], last_checkpoint[1])
+        self.assertEqual(scanner._checkpoints[-1][0], last_checkpoint[0] + 1)
+
+        # Checkpoints beyond an unbalanced element are reused once it is removed
+        self.assertEqual(positions(scanner.apply_edit(13, 13, ')')), (0, 0, 1, 13))
+        self.assertIsNone(scanner.apply_edit(13, 14, ''))
+        self.assertIs(scanner._checkpoints[-1][1], last_checkpoint[1])
+
+    def test_result(self):
+        scanner = Balance(tags=True).incremental('<p>text</p>')
+        self.assertIsNone(scanner.is_unbalanced())
+        unbalanced = scanner.apply_edit(3, 3, '(')
+        self.assertEqual(positions(unbalanced), (1, 3, 4, 8))
+        self.assertEqual(unbalanced.long_summary, Balance(tags=True).is_unbalanced('<p>(text</p>').long_summary)
+        self.assertEqual(positions(scanner.apply_edit(12, 12, ' (more')), (1, 3, 4, 8))
+        self.assertEqual(positions(scanner.apply_edit(3, 4, '')), (1, 12, 0, 0))
+
+    def test_wrong_edits(self):
+        scanner = Balance().incremental('text')
+        with self.assertRaises(ValueError):
+            scanner.apply_edit(3, 2, '')
+        with self.assertRaises(ValueError):
+            scanner.apply_edit(0, 5, '')
+        with self.assertRaises(TypeError):
+            scanner.apply_edit(0, 0, None)
+        with self.assertRaises(TypeError):
+            Balance().incremental(None)
@@ -0,0 +1,41 @@
+import random
+import unittest
+from balance import Balance
+from multi import MultiBalance
+from helpers import positions
+
+
+class TestMultiBalance(unittest.TestCase):
+    configurations = [{}, {'german': True}, {'straight': True}, {'cjk': True, 'math': True},
+                      {'tags': True, 'ignore_case': True}, {'pairs': [['((', '))'], ['begin', 'end']],
+                                                            'symmetrical': ['--'], 'custom': True},
+                      {'skip': Balance.SKIP_CODE + Balance.SKIP_ESCAPES, 'straight': True}, {'max_depth': 100}]
+    pieces = ['(', ')', '[', ']', '{', '}', '«', '»', '“', '”', '„', '「', '」', '"', "'", '`', '\\', '<a>', '</A>',
+              '<br>', '<', '>', '/', 'begin', 'end', '--', '((', '))', 'x', ' ']
+
+    def test_same_results_as_every_balance(self):
+        generator = random.Random(1)
+        for _ in range(50):
+            configurations = generator.sample(self.configurations, generator.randint(1, 4))
+            balances = [Balance(**configuration) for configuration in configurations]
+            multi_balance = MultiBalance(balances)
+            for _ in range(20):
+                string = ''.join(generator.choice(self.pieces) for _ in range(generator.randint(0, 30)))
+                with self.subTest(msg=string, configurations=configurations):
+                    self.assertEqual([positions(result) for result in multi_balance.is_unbalanced(string)],
+                                     [positions(balance.is_unbalanced(string)) for balance in balances])
+
+    def test_conventions(self):
+        multi_balance = MultiBalance([Balance(), Balance(german=True), Balance(straight=True)])
+        results = multi_balance.is_unbalanced('«quoted» and "quoted"')
+        self.assertIsNone(results[0])
+        self.assertEqual(positions(results[1]), (0, 0, 1, 0))  # « closes in German
+        self.assertIsNone(results[2])
+        self.assertEqual(multi_balance.is_unbalanced('plain text'), [None, None, None])
+        self.assertEqual(MultiBalance([]).is_unbalanced('(text'), [])
+
+    def test_wrong_arguments(self):
+        with self.assertRaisesRegex(TypeError, 'balances argument must be a list'):
+            MultiBalance(Balance())
+        with self.assertRaisesRegex(TypeError, 'first argument must be string'):
+            MultiBalance([Balance()]).is_unbalanced(b'()')
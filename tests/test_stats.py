@@ -0,0 +1,39 @@
+import unittest
+from balance import Balance
+from stats import ScanStats
+from helpers import positions
+
+
+class TestScanStats(unittest.TestCase):
+    def test_counters(self):
+        for engine, lookups in (('trie', 9), ('regex', 5)):
+            with self.subTest(engine=engine):
+                stats = ScanStats()
+                self.assertIsNone(Balance(engine=engine).is_unbalanced('a(b[c]d)e', stats=stats))
+                self.assertEqual((stats.scans, stats.characters, stats.lookups, stats.max_depth), (1, 9, lookups, 2))
+                self.assertEqual(stats.matches, {'tag': 0, 'opening': 2, 'symmetrical': 0, 'closing': 2, 'skip': 0})
+                self.assertGreater(stats.time, 0)
+
+    def test_counters_add_up(self):
+        stats = ScanStats()
+        balance = Balance(tags=True, straight=True)
+        self.assertEqual(positions(balance.is_unbalanced('a(b]c', stats=stats)), (1, 1, 1, 3))
+        self.assertIsNone(balance.is_unbalanced('<p>"x"</p>', stats=stats))
+        self.assertEqual((stats.scans, stats.characters, stats.max_depth), (2, 13, 2))
+        self.assertEqual(stats.matches, {'tag': 2, 'opening': 1, 'symmetrical': 2, 'closing': 1, 'skip': 0})
+
+    def test_same_results(self):
+        strings = ['', 'text', '(«a»[b]{c})', '(a]', '<div>(</div>)', 'a)', '<p title="<">x</P>', '"a(b"c)']
+        for configuration in ({'tags': True, 'straight': True}, {'tags': True, 'engine': 'regex'}):
+            balance = Balance(**configuration)
+            for string in strings:
+                with self.subTest(msg=string, configuration=configuration):
+                    self.assertEqual(positions(balance.is_unbalanced(string, stats=ScanStats())),
+                                     positions(balance.is_unbalanced(string)))
+
+    def test_callback(self):
+        calls = []
+        stats = ScanStats(callback=lambda scan_stats: calls.append(scan_stats.characters))
+        Balance().is_unbalanced('(text)', stats=stats)
+        Balance().is_unbalanced('[more', stats=stats)
+        self.assertEqual(calls, [6, 11])
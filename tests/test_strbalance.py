@@ -0,0 +1,49 @@
+import unittest
+from strbalance import cache_clear, cache_info, is_balanced, is_unbalanced, set_cache_size
+
+
+class TestBalanceCache(unittest.TestCase):
+    def setUp(self):
+        cache_clear()
+
+    def tearDown(self):
+        set_cache_size(128)
+
+    def test_hits_and_misses(self):
+        self.assertIsNone(is_unbalanced('(a)', pairs=[['begin', 'end']]))
+        self.assertIsNotNone(is_unbalanced('begin', pairs=[['begin', 'end']]))
+        self.assertIsNotNone(is_unbalanced('begin', pairs=[('begin', 'end')]))
+        self.assertIsNone(is_unbalanced('(', pairs=[['begin', 'end']], custom=True))
+        info = cache_info()
+        self.assertEqual((info.hits, info.misses, info.currsize), (2, 2, 2))
+
+        cache_clear()
+        info = cache_info()
+        self.assertEqual((info.hits, info.misses, info.currsize), (0, 0, 0))
+
+    def test_is_balanced(self):
+        self.assertTrue(is_balanced('(a)', pairs=[['begin', 'end']]))
+        self.assertFalse(is_balanced('begin', pairs=[['begin', 'end']]))
+        self.assertEqual(cache_info().currsize, 1)
+
+    def test_bounded_size(self):
+        set_cache_size(2)
+        for symmetrical in ('-', '+', '*', '-'):
+            is_unbalanced('a{}b', symmetrical=[symmetrical])
+        info = cache_info()
+        self.assertEqual((info.hits, info.misses, info.maxsize, info.currsize), (0, 4, 2, 2))
+
+    def test_invalid_parameters_are_not_cached(self):
+        with self.assertRaisesRegex(TypeError, 'pairs argument must be a list'):
+            is_unbalanced('abc', pairs='someline')
+        with self.assertRaisesRegex(ValueError, 'pairs must contain two elements each'):
+            is_unbalanced('abc', pairs=[['(+', '>', '((']])
+        self.assertEqual(cache_info().currsize, 0)
+
+    def test_bool_limits_are_rejected(self):
+        self.assertIsNone(is_unbalanced('(a)', max_depth=1))
+        for limit in ('max_depth', 'max_input_length', 'timeout'):
+            with self.subTest(limit=limit):
+                with self.assertRaisesRegex(ValueError, limit + ' must be None or a non-negative number'):
+                    is_unbalanced('(a)', **{limit: True})
+        self.assertEqual(cache_info().currsize, 1)
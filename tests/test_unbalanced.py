@@ -1,5 +1,6 @@
+import pickle
 import unittest
-from unbalanced import Unbalanced
+from unbalanced import SparseString, Unbalanced
 
 
 class TestSummaries(unittest.TestCase):
@@ -73,3 +74,62 @@ class TestSummaries(unittest.TestCase):
                 self.assertEqual(unbalanced.short_summary, summary)
                 self.assertEqual(unbalanced.long_summary, summary)
                 self.assertEqual(unbalanced.unclosed, '')
+
+
+class TestSparseString(unittest.TestCase):
+    sparse_string = SparseString(30, [(10, 'abcdef'), (0, '0123'), (13, 'defgh'), (25, 'xyz')])
+
+    def test_slices(self):
+        self.assertEqual(len(self.sparse_string), 30)
+        self.assertEqual(self.sparse_string[:], '0123...abcdefgh...xyz...')
+        self.assertEqual(self.sparse_string[0:4], '0123')
+        self.assertEqual(self.sparse_string[2:12], '23...ab')
+        self.assertEqual(self.sparse_string[12:14], 'cd')
+        self.assertEqual(self.sparse_string[5:9], '...')
+        self.assertEqual(self.sparse_string[29:], '...')
+        self.assertEqual(self.sparse_string[:0], '')
+
+    def test_summaries(self):
+        unbalanced = Unbalanced(SparseString(100, [(0, 'abcdefgh(ijkl'), (90, 'mn]opqrstu')]), 1, 8, 1, 92)
+        self.assertEqual(unbalanced.short_summary, '...fgh(ijk...')
+        self.assertEqual(unbalanced.long_summary, '...fgh(ijkl...mn]opq...')
+        self.assertEqual(unbalanced.unclosed, '(')
+
+
+class TestCompact(unittest.TestCase):
+    def _results(self):
+        for string, opening_pos, closing_pos, _, _ in TestSummaries.unbalanced_lines_chars:
+            yield Unbalanced(string, 1, opening_pos, 1, closing_pos)
+        for string, opening_length, opening_pos, closing_length, closing_pos, _, _, _ \
+                in TestSummaries.unbalanced_lines_long:
+            yield Unbalanced(string, opening_length, opening_pos, closing_length, closing_pos)
+        for string, opening_pos, opening_length, _, _, _ in TestSummaries.unbalanced_lines_without_ending:
+            yield Unbalanced(string, opening_length, opening_pos)
+        for string, closing_pos, closing_length, _ in TestSummaries.unbalanced_lines_without_beginning:
+            yield Unbalanced(string, 0, 0, closing_length, closing_pos)
+
+    def test_same_summaries(self):
+        for unbalanced in self._results():
+            for compact in (unbalanced.compact(), pickle.loads(pickle.dumps(unbalanced))):
+                with self.subTest(msg=unbalanced.long_summary):
+                    self.assertEqual(compact.short_summary, unbalanced.short_summary)
+                    self.assertEqual(compact.long_summary, unbalanced.long_summary)
+                    self.assertEqual(compact.unclosed, unbalanced.unclosed)
+                    self.assertEqual((compact.opening_length, compact.opening_position,
+                                      compact.closing_length, compact.closing_position),
+                                     (unbalanced.opening_length, unbalanced.opening_position,
+                                      unbalanced.closing_length, unbalanced.closing_position))
+
+    def test_long_string(self):
+        string = 'abcdefgh(ijkl' + 'x' * 100000 + 'mn]opqrstu'
+        unbalanced = Unbalanced(string, 1, 8, 1, len(string) - 8)
+        compact = unbalanced.compact()
+        self.assertEqual(compact.short_summary, '...fgh(ijk...')
+        self.assertEqual(compact.long_summary, '...fgh(ijkl' + 'x' * (Unbalanced.COMPACT_CONTEXT_LENGTH - 4) + '...' +
+                         'x' * (Unbalanced.COMPACT_CONTEXT_LENGTH - 2) + 'mn]opq...')
+        self.assertLess(len(pickle.dumps(unbalanced)), 500)
+        self.assertIs(compact.compact(), compact)
+
+    def test_slots(self):
+        with self.assertRaises(AttributeError):
+            Unbalanced('(', 1, 0).attribute = None